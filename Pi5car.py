@@ -1,34 +1,186 @@
 from flask import Flask, Response, render_template_string, request, jsonify
-from gpiozero import DigitalOutputDevice, PWMOutputDevice, DistanceSensor
+from gpiozero import DigitalOutputDevice, PWMOutputDevice
+from gpiozero import InputDevice as GPIOInputDevice
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPWMPin
 import cv2
+import numpy as np
 import threading
+import asyncio
 import time
-from evdev import InputDevice, categorize, ecodes
-from evdev import list_devices
-import pyaudio
-from vosk import Model, KaldiRecognizer, SetLogLevel
 import json
+import os
+import logging
+import logging.handlers
 import queue
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
+from collections import deque, namedtuple
+# The native packages below are required on the Pi; the simulated backend
+# runs without them (see Hardware Backend).
+try:
+    from evdev import InputDevice, categorize, ecodes
+    from evdev import list_devices
+except ImportError:
+    InputDevice = categorize = ecodes = list_devices = None
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+try:
+    from vosk import Model, KaldiRecognizer, SetLogLevel
+except ImportError:
+    Model = KaldiRecognizer = SetLogLevel = None
+try:
+    import mediapipe as mp
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+    from mediapipe.framework.formats import landmark_pb2
+except ImportError:
+    mp = python = vision = landmark_pb2 = None
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:  # Without flask-sock the page falls back to per-press HTTP requests
+    Sock = None
+try:
+    import pyudev
+except ImportError:  # Without pyudev the controller thread watches the /dev/input listing instead
+    pyudev = None
+
+# --- Logging Setup ---
+# Log records are handed to a queue and written by a QueueListener thread, so
+# the motor, controller, speech and gesture threads never block on stdout.
+LOG_LEVEL = logging.INFO
+LOG_QUEUE_SIZE = 1000
+LOG_REPEAT_INTERVAL = 1.0  # Identical messages inside this window are folded
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RepeatFilter(logging.Filter):
+    """Suppresses a message repeated within `interval` seconds.
+
+    The next copy that gets through carries the number of copies that were
+    swallowed in between as `record.repeats`.
+    """
+
+    def __init__(self, interval=LOG_REPEAT_INTERVAL, max_keys=256):
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                return False
+            if len(self._seen) >= self.max_keys:
+                self._seen.clear()
+            self._seen[key] = [now, 0]
+        record.repeats = entry[1] if entry is not None else 0
+        record.mode = current_control_mode
+        return True
+
+class StructuredFormatter(logging.Formatter):
+    """Appends the control mode and any `fields` passed via `extra` as key=value pairs."""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {'mode': getattr(record, 'mode', None)}
+        fields.update(getattr(record, 'fields', {}))
+        line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if getattr(record, 'repeats', 0):
+            line += f" (repeated {record.repeats} more times)"
+        return line
+
+log = logging.getLogger('pi5car')
+log.setLevel(LOG_LEVEL)
+log.propagate = False
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+log_handler = NonBlockingQueueHandler(log_queue)
+log_handler.addFilter(RepeatFilter())
+log.addHandler(log_handler)
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(StructuredFormatter('%(asctime)s %(levelname)s [%(threadName)s] %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, _log_stream_handler)
+log_listener.start()
+
+def latency_summary(samples_ms, name='latency'):
+    latencies = sorted(samples_ms)
+    if not latencies:
+        return {}
+    return {
+        f'{name}_ms_p50': round(latencies[len(latencies) // 2], 1),
+        f'{name}_ms_p95': round(latencies[int(len(latencies) * 0.95)], 1),
+    }
+
+def log_action(action, ena_speed, enb_speed):
+    log.info("Action: %s (L:%.2f, R:%.2f)", action, ena_speed, enb_speed,
+             extra={'fields': {'action': action, 'ena': round(ena_speed, 2), 'enb': round(enb_speed, 2)}})
+
+# --- Hardware Backend ---
+# PI5CAR_BACKEND=sim runs the whole stack on an ordinary Linux box: MockFactory
+# GPIO pins with a simulated sonar, a synthetic or video-file camera, WAV files
+# as the microphone and a stub gesture recognizer (see pi5car_sim.py). Model
+# and media paths can be overridden for either backend.
+HARDWARE_BACKEND = os.environ.get('PI5CAR_BACKEND', 'pi')
+SIMULATED = HARDWARE_BACKEND == 'sim'
+CAMERA_SOURCE = os.environ.get('PI5CAR_CAMERA', 'synthetic' if SIMULATED else '0')  # index, video file or 'synthetic'
+SIM_GESTURE_SCRIPT = os.environ.get('PI5CAR_SIM_GESTURES', '')     # e.g. "None:3,Thumb_Up:1,Victory:2"
+SIM_AUDIO_WAVS = [path for path in os.environ.get('PI5CAR_SIM_AUDIO', '').split(os.pathsep) if path]
+SIM_OBSTACLE_CM = float(os.environ.get('PI5CAR_SIM_OBSTACLE_CM', '200'))
+
+if SIMULATED:
+    import pi5car_sim
+    Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+    if pyaudio is None:
+        pyaudio = pi5car_sim.pyaudio
+    if ecodes is None:
+        ecodes, list_devices = pi5car_sim.ecodes, pi5car_sim.list_devices
+else:
+    missing = [name for name, module in (('evdev', ecodes), ('pyaudio', pyaudio),
+                                         ('vosk', Model), ('mediapipe', mp)) if module is None]
+    if missing:
+        raise ImportError(f"The Pi backend needs {', '.join(missing)}; PI5CAR_BACKEND=sim runs without them")
 
 # --- Vosk Speech Recognition Setup ---
-VOSK_MODEL_PATH = "/home/jacky/models/vosk-model-small-en-us-0.15"
+VOSK_MODEL_PATH = os.environ.get('PI5CAR_VOSK_MODEL', "/home/jacky/models/vosk-model-small-en-us-0.15")
+# The simulated backend uses the stub recognizer unless the model is there.
+VOSK_USE_STUB = SIMULATED and not os.path.isdir(VOSK_MODEL_PATH)
 VOSK_MIC_INDEX = 0
+VOSK_SAMPLE_RATE = 16000
+VOSK_CHUNK_FRAMES = 1600        # 100 ms of audio per PyAudio callback
+VOSK_RING_CHUNKS = 20           # Audio buffered before the oldest chunk is dropped
+VOSK_PARTIAL_STABLE_COUNT = 2   # Identical partial results needed to act early
 
-vosk_model = None
+vosk_model = None  # Loaded once and kept for the life of the process
+vosk_model_lock = threading.Lock()
 vosk_recognizer = None
+speech_pipeline = None
 p_audio = None
 audio_stream = None
 speech_active = False
 speech_history_queue = queue.Queue(maxsize=1)
 COMMAND_DURATION = 2
 
-KNOWN_COMMANDS = [
-    "front", "back", "left", "right", "stop",
-    "net", "laugh", "less", "write", "far", "sack"
-]
+# Commands the car understands; the words and phrases that trigger them live
+# in the voice alias table, which also forms the recognizer's grammar.
+KNOWN_COMMANDS = ["front", "back", "left", "right", "stop"]
+VOSK_USE_GRAMMAR = True
 
 # --- GPIO Pin Definitions ---
 ENA_GPIO = 24
@@ -52,7 +204,8 @@ ena = PWMOutputDevice(ENA_GPIO)
 in3 = DigitalOutputDevice(IN3_GPIO)
 in4 = DigitalOutputDevice(IN4_GPIO)
 enb = PWMOutputDevice(ENB_GPIO)
-distance_sensor = DistanceSensor(echo=ECHO_PIN, trigger=TRIGGER_PIN, max_distance=4)  # Max distance in meters
+sonar_trigger = DigitalOutputDevice(TRIGGER_PIN)
+sonar_echo = GPIOInputDevice(ECHO_PIN, pull_up=False)
 buzzer = DigitalOutputDevice(BUZZER_PIN)
 green_led1 = DigitalOutputDevice(GREEN_LED1_PIN)
 green_led2 = DigitalOutputDevice(GREEN_LED2_PIN)
@@ -84,341 +237,1791 @@ nintendo_controller = None
 obstacle_detection_active = False
 obstacle_warning = False
 
+# --- Telemetry Push ---
+TELEMETRY_HEARTBEAT = 15  # Seconds between SSE keep-alive comments
+
+class TelemetryHub:
+    """Pushes obstacle, speech, controller and mode changes to /events clients.
+
+    Every topic keeps its last payload. A new client gets that snapshot first
+    and then only changes. Each client holds at most one pending payload per
+    topic, so a slow client gets the newest state and never a backlog.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+        self._clients = []
+
+    def publish(self, topic, payload):
+        with self._lock:
+            if self._state.get(topic) == payload:
+                return
+            self._state[topic] = payload
+            for pending, wakeup in self._clients:
+                pending[topic] = payload
+                wakeup.set()
+
+    def stream(self):
+        wakeup = threading.Event()
+        with self._lock:
+            pending = dict(self._state)
+            client = (pending, wakeup)
+            self._clients.append(client)
+        wakeup.set()
+        try:
+            while True:
+                if not wakeup.wait(TELEMETRY_HEARTBEAT):
+                    yield ': keep-alive\n\n'
+                    continue
+                with self._lock:
+                    wakeup.clear()
+                    events = list(pending.items())
+                    pending.clear()
+                for topic, payload in events:
+                    yield f"event: {topic}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            with self._lock:
+                self._clients.remove(client)
+
+telemetry = TelemetryHub()
+telemetry.publish('mode', {'mode': current_control_mode})
+telemetry.publish('obstacle', {'warning': False, 'blocked': False})
+telemetry.publish('controller', {'status': 'disconnected', 'name': 'N/A'})
+
 # --- Camera Setup ---
-camera = cv2.VideoCapture(0)
-camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+CAMERA_RING_SIZE = 4
+CAMERA_WIDTH = 640
+CAMERA_HEIGHT = 480
+# Ask the webcam for its own MJPEG stream and keep the compressed buffers. They
+# go to /video_feed as they are, and a frame is only decoded when something
+# (the gesture recognizer, the overlay, a smaller video profile) needs pixels.
+CAMERA_MJPEG_PASSTHROUGH = True
+
+def open_camera(source):
+    if source == 'synthetic':
+        # Imported here so the Pi backend can also run without a webcam.
+        from pi5car_sim import SyntheticCamera
+        capture = SyntheticCamera(CAMERA_WIDTH, CAMERA_HEIGHT, script=SIM_GESTURE_SCRIPT)
+    elif not source.isdigit():
+        return pi5car_sim.VideoFileCamera(source) if SIMULATED else cv2.VideoCapture(source)
+    else:
+        capture = cv2.VideoCapture(int(source))
+        if CAMERA_MJPEG_PASSTHROUGH:
+            capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+        if CAMERA_MJPEG_PASSTHROUGH and int(capture.get(cv2.CAP_PROP_FOURCC)) != cv2.VideoWriter_fourcc(*'MJPG'):
+            # The driver kept another format (raw YUYV, say). Without
+            # conversion those frames would come out as 2-channel arrays, so
+            # let OpenCV convert them to BGR as before.
+            log.warning("Camera %s refused MJPG; MJPEG passthrough is off", source)
+            return capture
+    if CAMERA_MJPEG_PASSTHROUGH:
+        capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+    return capture
+
+camera = open_camera(CAMERA_SOURCE)
+
+camera_stats = {
+    'frames_captured': 0,
+    'frames_passthrough': 0,  # Captured as MJPEG and not decoded at capture time
+    'frames_decoded': 0,      # Passthrough frames later decoded for a consumer
+    'frames_corrupt': 0,      # Passthrough frames whose JPEG failed to decode
+}
 
-# --- Mediapipe Setup ---
-mp_drawing = mp.solutions.drawing_utils
-mp_drawing_styles = mp.solutions.drawing_styles
-mp_hands = mp.solutions.hands
+class Frame:
+    """A captured frame as seen by consumers.
+
+    `image` is read-only and shared, so anything that wants to draw on it
+    has to take its own copy first. A passthrough frame arrives as the
+    camera's JPEG buffer in `jpeg`; its `image` is decoded on first access
+    and then kept for every other consumer. A buffer that does not decode
+    (corrupt or truncated) leaves `image` None, and consumers drop the frame.
+    """
+
+    __slots__ = ('seq', 'timestamp', 'jpeg', '_image', '_corrupt', '_lock')
+
+    def __init__(self, seq, timestamp, image=None, jpeg=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.jpeg = jpeg
+        self._image = image
+        self._corrupt = False
+        self._lock = threading.Lock()
+
+    @property
+    def decoded(self):
+        return self._image is not None
+
+    @property
+    def image(self):
+        if self._image is None and not self._corrupt:
+            with self._lock:
+                if self._image is None and not self._corrupt:
+                    image = cv2.imdecode(self.jpeg, cv2.IMREAD_COLOR)
+                    if image is None:
+                        self._corrupt = True
+                        camera_stats['frames_corrupt'] += 1
+                        return None
+                    image.flags.writeable = False
+                    self._image = image
+                    camera_stats['frames_decoded'] += 1
+        return self._image
+
+class FrameRing:
+    """Ring buffer holding the most recent camera frames.
+
+    The capture thread is the only writer. Readers get the newest frame by
+    reference together with its sequence number, so any number of consumers
+    can share one capture without copying or touching the device.
+    """
+
+    def __init__(self, size=CAMERA_RING_SIZE):
+        self._slots = [None] * size
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def publish(self, image=None, jpeg=None):
+        if image is not None:
+            image.flags.writeable = False
+        with self._cond:
+            self._seq += 1
+            self._slots[self._seq % len(self._slots)] = Frame(self._seq, time.monotonic(), image, jpeg)
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self):
+        with self._cond:
+            if self._seq == 0:
+                return None
+            return self._slots[self._seq % len(self._slots)]
+
+    def wait_newer(self, last_seq, timeout=1.0):
+        """Block until a frame newer than `last_seq` exists; None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq, timeout):
+                return None
+            return self._slots[self._seq % len(self._slots)]
+
+frame_ring = FrameRing()
+
+def camera_capture_thread():
+    while True:
+        success, image = camera.read()
+        if not success:
+            time.sleep(0.1)
+            continue
+        camera_stats['frames_captured'] += 1
+        if image.ndim == 3:
+            # Already BGR: passthrough is off, the camera refused MJPG, or the
+            # source only delivers decoded frames.
+            frame_ring.publish(image)
+        else:
+            camera_stats['frames_passthrough'] += 1
+            frame_ring.publish(jpeg=image.reshape(-1))
 
-def init_gesture_recognizer():
-    global gesture_recognizer
-    model_path = "/home/jacky/mediapipe-samples/examples/gesture_recognizer/raspberry_pi/gesture_recognizer.task"
-    base_options = python.BaseOptions(model_asset_path=model_path)
+capture_thread = threading.Thread(target=camera_capture_thread, daemon=True)
+capture_thread.start()
+
+# --- Mediapipe Setup ---
+if mp is not None:
+    mp_drawing = mp.solutions.drawing_utils
+    mp_drawing_styles = mp.solutions.drawing_styles
+    mp_hands = mp.solutions.hands
+
+def as_mp_image(rgb):
+    """Wrap an RGB array for the recognizer; the stub takes the bare array."""
+    if mp is None:
+        return rgb
+    return mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+
+# 'live_stream' runs the recognizer asynchronously and drops frames while it is
+# busy; 'image' keeps the original synchronous recognize() polling loop.
+GESTURE_RUNNING_MODE = 'live_stream'
+GESTURE_INFERENCE_TIMEOUT = 1.0  # Seconds before a lost async result is given up on
+
+GESTURE_MODEL_PATH = os.environ.get(
+    'PI5CAR_GESTURE_MODEL',
+    "/home/jacky/mediapipe-samples/examples/gesture_recognizer/raspberry_pi/gesture_recognizer.task")
+# The simulated backend uses the stub recognizer unless a real model is given.
+GESTURE_USE_STUB = SIMULATED and 'PI5CAR_GESTURE_MODEL' not in os.environ
+
+def create_gesture_recognizer(result_callback=None):
+    """IMAGE-mode recognizer, or LIVE_STREAM mode when a result callback is given."""
+    if GESTURE_USE_STUB:
+        return pi5car_sim.StubGestureRecognizer(result_callback)
+    base_options = python.BaseOptions(model_asset_path=GESTURE_MODEL_PATH)
     options = vision.GestureRecognizerOptions(base_options=base_options,
-                                              running_mode=vision.RunningMode.IMAGE,
                                               num_hands=1,
                                               min_hand_detection_confidence=0.5,
                                               min_hand_presence_confidence=0.5,
                                               min_tracking_confidence=0.5)
-    gesture_recognizer = vision.GestureRecognizer.create_from_options(options)
+    if result_callback is not None:
+        options.running_mode = vision.RunningMode.LIVE_STREAM
+        options.result_callback = result_callback
+    else:
+        options.running_mode = vision.RunningMode.IMAGE
+    return vision.GestureRecognizer.create_from_options(options)
 
-init_gesture_recognizer()
+def init_gesture_recognizer():
+    global gesture_recognizer
+    live_stream = GESTURE_RUNNING_MODE == 'live_stream'
+    gesture_recognizer = create_gesture_recognizer(gesture_result_callback if live_stream else None)
+
+# --- Hand Tracking ---
+# Once a hand has been found, inference runs on a padded crop around it at a
+# reduced resolution instead of on the whole frame. When the hand is missed a
+# few times in a row, tracking is dropped and the full frame is searched again.
+# Only used in 'image' mode: a LIVE_STREAM recognizer tracks the hand from the
+# previous frame itself, and a crop that moves and changes size between frames
+# would throw that tracking off.
+GESTURE_ROI_TRACKING = GESTURE_RUNNING_MODE == 'image'
+GESTURE_ROI_PADDING = 0.5      # Added on every side, as a fraction of the hand box size
+GESTURE_ROI_MIN_SIZE = 128     # Smallest crop side in frame pixels
+GESTURE_ROI_INPUT_SIZE = 224   # Longest side of the crop after downscaling
+GESTURE_ROI_MAX_MISSES = 2     # Crops without a hand before falling back to the full frame
+
+Region = namedtuple('Region', ['x0', 'y0', 'x1', 'y1'])  # Frame pixels, x1/y1 exclusive
+Landmark = namedtuple('Landmark', ['x', 'y', 'z'])
+
+class HandTracker:
+    """Chooses the part of the frame the next gesture inference looks at.
+
+    `crop()` returns the input image and the region it covers (None for
+    the full frame). `update()` takes the result for that region, maps its
+    landmarks back to full-frame coordinates and moves the region to the
+    hand, or gives up on tracking after GESTURE_ROI_MAX_MISSES misses.
+    """
+
+    def __init__(self, enabled=GESTURE_ROI_TRACKING):
+        self.enabled = enabled
+        self.region = None
+        self.misses = 0
+
+    def reset(self):
+        self.region = None
+        self.misses = 0
+
+    def crop(self, image):
+        region = self.region if self.enabled else None
+        if region is None:
+            return image, None
+        crop = image[region.y0:region.y1, region.x0:region.x1]
+        scale = GESTURE_ROI_INPUT_SIZE / max(crop.shape[0], crop.shape[1])
+        if scale < 1:
+            crop = cv2.resize(crop, (round(crop.shape[1] * scale), round(crop.shape[0] * scale)),
+                              interpolation=cv2.INTER_AREA)
+        return crop, region
+
+    @staticmethod
+    def to_frame(hand_landmarks, region, width, height):
+        """Map landmarks normalised to `region` to landmarks normalised to the frame."""
+        if region is None:
+            return hand_landmarks
+        scale_x = (region.x1 - region.x0) / width
+        scale_y = (region.y1 - region.y0) / height
+        return [[Landmark(region.x0 / width + landmark.x * scale_x,
+                          region.y0 / height + landmark.y * scale_y, landmark.z)
+                 for landmark in hand] for hand in hand_landmarks]
+
+    def update(self, hand_landmarks, width, height):
+        """`hand_landmarks` must already be in frame coordinates."""
+        if not self.enabled:
+            return
+        if not hand_landmarks:
+            self.misses += 1
+            if self.misses >= GESTURE_ROI_MAX_MISSES:
+                self.region = None
+            return
+        xs = [landmark.x * width for landmark in hand_landmarks[0]]
+        ys = [landmark.y * height for landmark in hand_landmarks[0]]
+        size = max(max(xs) - min(xs), max(ys) - min(ys), 1.0)
+        half = max(size * (0.5 + GESTURE_ROI_PADDING), GESTURE_ROI_MIN_SIZE / 2)
+        centre_x = (max(xs) + min(xs)) / 2
+        centre_y = (max(ys) + min(ys)) / 2
+        self.region = Region(max(0, int(centre_x - half)), max(0, int(centre_y - half)),
+                             min(width, int(centre_x + half)), min(height, int(centre_y + half)))
+        self.misses = 0
+
+hand_tracker = HandTracker()
+
+# --- Motion Gate ---
+# While the scene does not change there is nothing new to recognize, so the
+# previous gesture result is reused instead of running inference. Frames are
+# compared as tiny greyscale thumbnails against the last inferred one; a
+# passthrough frame's thumbnail comes from a reduced JPEG decode, so gated
+# frames are never fully decoded.
+GESTURE_GATE_ENABLED = True
+GESTURE_GATE_THUMBNAIL = (64, 48)
+GESTURE_GATE_PIXEL_DELTA = 15         # Grey levels a thumbnail pixel must move to count as changed
+GESTURE_GATE_CHANGED_FRACTION = 0.005 # Share of changed pixels that triggers inference (~15 px)
+GESTURE_GATE_MAX_SKIP = 1.0           # Seconds after which a frame is inferred regardless
+
+def frame_thumbnail(frame):
+    """Greyscale gate thumbnail of `frame`, or None if the frame does not decode."""
+    if frame.jpeg is not None and not frame.decoded:
+        grey = cv2.imdecode(frame.jpeg, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    elif frame.image is not None:
+        grey = cv2.cvtColor(frame.image, cv2.COLOR_BGR2GRAY)
+    else:
+        grey = None
+    if grey is None:
+        return None
+    return cv2.resize(grey, GESTURE_GATE_THUMBNAIL, interpolation=cv2.INTER_AREA)
+
+class MotionGate:
+    """Decides whether a frame differs enough from the last inferred one.
+
+    The clock is injectable so recorded clips can be gated in frame time.
+    """
+
+    def __init__(self, enabled=GESTURE_GATE_ENABLED, clock=time.monotonic):
+        self.enabled = enabled
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.last_inferred = None
+
+    def should_infer(self, thumbnail, force=False):
+        """True if the frame must be inferred; `force` infers it regardless."""
+        if not self.enabled:
+            return True
+        now = self.clock()
+        thumbnail = thumbnail.astype(np.int16)
+        if not force and self.reference is not None and now - self.last_inferred < GESTURE_GATE_MAX_SKIP:
+            changed = np.count_nonzero(np.abs(thumbnail - self.reference) > GESTURE_GATE_PIXEL_DELTA)
+            if changed < GESTURE_GATE_CHANGED_FRACTION * thumbnail.size:
+                return False
+        self.reference = thumbnail
+        self.last_inferred = now
+        return True
+
+motion_gate = MotionGate()
+
+# --- Motor Output ---
+# One complete drive state: H-bridge direction pins, PWM duty on both enable
+# pins, and the front (green) / back (red) LED pairs.
+DriveCommand = namedtuple('DriveCommand', ['in1', 'in2', 'in3', 'in4', 'ena', 'enb', 'green', 'red'])
+
+STOP_COMMAND = DriveCommand(0, 0, 0, 0, 0.0, 0.0, 0, 0)
+
+INTERLOCK_TURN_DUTY = 0.4   # Most duty a wheel may drive forward while the interlock is engaged
+
+def drives_forward(command):
+    """True if both wheels are driven forward.
+
+    A pivot (one wheel forward, the other stopped) or spin turn does not
+    count, so a car stopped by the interlock can still turn away from the
+    obstacle in modes that have no reverse.
+    """
+    return bool(command.in1 and command.ena > 0 and command.in4 and command.enb > 0)
+
+def cap_forward_duty(command):
+    """`command` with any forward-driven wheel limited to INTERLOCK_TURN_DUTY.
+
+    A pivot still pushes its outer wheel towards the obstacle, so while the
+    interlock is engaged turns are only let through at reduced duty.
+    """
+    return command._replace(ena=min(command.ena, INTERLOCK_TURN_DUTY) if command.in1 else command.ena,
+                            enb=min(command.enb, INTERLOCK_TURN_DUTY) if command.in4 else command.enb)
+
+class MotorOutput:
+    """Applies DriveCommands to the motor and LED pins.
+
+    The last applied value of every output is remembered and only outputs
+    whose value changed are written. A whole command is applied under one
+    lock so two control threads can never leave the H-bridge half set up.
+
+    The same lock backs the obstacle interlock: while forward motion is
+    blocked, any command that drives both wheels forward is replaced by a
+    stop and turns are capped to INTERLOCK_TURN_DUTY, no matter which
+    control mode issued them.
+    """
+
+    def __init__(self, devices):
+        self._devices = devices
+        self._applied = {}
+        self._lock = threading.Lock()
+        self.write_count = 0
+        self.forward_blocked = False
+        self.blocked_count = 0
+
+    def _write(self, command):
+        changed = False
+        for name, value in zip(command._fields, command):
+            if self._applied.get(name) == value:
+                continue
+            for device in self._devices[name]:
+                device.value = value
+                self.write_count += 1
+            self._applied[name] = value
+            changed = True
+        return changed
+
+    def apply(self, command):
+        """Apply `command`; returns True if it changed an output and was not blocked."""
+        with self._lock:
+            if self.forward_blocked and drives_forward(command):
+                self.blocked_count += 1
+                self._write(STOP_COMMAND)
+                log.warning("Forward motion blocked by obstacle interlock")
+                return False
+            if self.forward_blocked:
+                command = cap_forward_duty(command)
+            return self._write(command)
+
+    def set_forward_blocked(self, blocked):
+        """Engage or release the interlock; returns True if engaging it braked the car."""
+        with self._lock:
+            self.forward_blocked = blocked
+            current = DriveCommand(**self._applied) if len(self._applied) == len(DriveCommand._fields) else None
+            if blocked and current is not None:
+                if drives_forward(current):
+                    self._write(STOP_COMMAND)
+                    return True
+                self._write(cap_forward_duty(current))
+        return False
+
+    def current(self):
+        with self._lock:
+            if len(self._applied) != len(DriveCommand._fields):
+                return None
+            return DriveCommand(**self._applied)
+
+motor_output = MotorOutput({
+    'in1': [in1], 'in2': [in2],
+    'in3': [in3], 'in4': [in4],
+    'ena': [ena], 'enb': [enb],
+    'green': [green_led1, green_led2],
+    'red': [red_led1, red_led2],
+})
+
+# --- Drive Kinematics ---
+# Every control mode sets a (linear, angular) velocity setpoint in PWM duty
+# units and DifferentialDrive ramps the two H-bridge channels towards it at a
+# fixed control rate, so no mode can step a wheel from 0 to full duty at once.
+DRIVE_CONTROL_HZ = 50
+DRIVE_ACCEL_LIMIT = 2.0        # Duty per second when a wheel speeds up (0 to full in 0.5 s)
+DRIVE_DECEL_LIMIT = 5.0        # Duty per second when a wheel slows down or reverses
+TURN_INNER_SPEED_RATIO = 0.0   # Share of the turn speed the inner wheel keeps; 0 pivots like the original turns
+
+def channel_command(speed_a, speed_b):
+    """DriveCommand for signed duty cycles on channel A (ENA/IN1/IN2) and B (ENB/IN3/IN4).
+
+    Channel A is the side turn_left drives. Duty is rounded to 1% so a ramp
+    or analog noise only writes the PWM pins when the duty really changes.
+    """
+    speed_a = round(max(-1.0, min(1.0, speed_a)), 2)
+    speed_b = round(max(-1.0, min(1.0, speed_b)), 2)
+    return DriveCommand(int(speed_a > 0), int(speed_a < 0),
+                        int(speed_b < 0), int(speed_b > 0),
+                        abs(speed_a), abs(speed_b),
+                        int(speed_a > 0 and speed_b > 0), int(speed_a < 0 and speed_b < 0))
+
+class DifferentialDrive:
+    """Turns (linear, angular) setpoints into ramped per-channel PWM and direction.
+
+    Positive angular turns left: channel A runs at linear + angular and
+    channel B at linear - angular, scaled down together if either would
+    exceed full duty so the curvature is kept. `step()` moves both channels
+    one control period towards their targets within the acceleration limits
+    and applies the result through MotorOutput; `run()` calls it at
+    `control_hz` while a ramp is in progress and sleeps otherwise. A ramp
+    that runs into the forward interlock is dropped, so the car does not
+    creep back into an obstacle once the interlock releases.
+    """
+
+    def __init__(self, output, control_hz=DRIVE_CONTROL_HZ,
+                 accel_limit=DRIVE_ACCEL_LIMIT, decel_limit=DRIVE_DECEL_LIMIT):
+        self.output = output
+        self.period = 1 / control_hz
+        self.accel_limit = accel_limit
+        self.decel_limit = decel_limit
+        self.ticks = 0
+        self._cond = threading.Condition()
+        self._target = (0.0, 0.0)
+        self._current = (0.0, 0.0)
+
+    @staticmethod
+    def wheel_speeds(linear, angular):
+        speed_a = linear + angular
+        speed_b = linear - angular
+        scale = max(1.0, abs(speed_a), abs(speed_b))
+        return round(speed_a / scale, 2), round(speed_b / scale, 2)
+
+    def set_velocity(self, linear, angular, action="drive"):
+        """Set a new setpoint; returns True (and logs it) if the target changed."""
+        target = self.wheel_speeds(linear, angular)
+        with self._cond:
+            if target == self._target:
+                return False
+            self._target = target
+            self._cond.notify()
+        log_action(action, *target)
+        return True
+
+    def halt(self):
+        """Drop the setpoint and stop both channels immediately, without a ramp."""
+        with self._cond:
+            self._target = self._current = (0.0, 0.0)
+            self.output.apply(STOP_COMMAND)
+
+    def targets(self):
+        with self._cond:
+            return self._target
+
+    def _ramp(self, current, target):
+        speeding_up = abs(target) > abs(current) and current * target >= 0
+        delta = (self.accel_limit if speeding_up else self.decel_limit) * self.period
+        if abs(target - current) <= delta:
+            return target
+        return current + delta if target > current else current - delta
+
+    def step(self):
+        """Advance one control period; returns True while still ramping."""
+        with self._cond:
+            speeds = (self._ramp(self._current[0], self._target[0]),
+                      self._ramp(self._current[1], self._target[1]))
+            command = channel_command(*speeds)
+            if self.output.forward_blocked and drives_forward(command):
+                speeds = self._target = (0.0, 0.0)
+            self._current = speeds
+            self.output.apply(command)
+            self.ticks += 1
+            return self._current != self._target
+
+    def run(self):
+        last_step = 0.0
+        while True:
+            with self._cond:
+                while self._current == self._target:
+                    self._cond.wait()
+            # A new ramp starts straight away unless the last step was less
+            # than a period ago, which would break the acceleration limit.
+            next_tick = max(time.monotonic(), last_step + self.period)
+            ramping = True
+            while ramping:
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+                ramping = self.step()
+                last_step = next_tick
+                next_tick += self.period
+
+drive = DifferentialDrive(motor_output)
+drive_thread = threading.Thread(target=drive.run, daemon=True)
+drive_thread.start()
 
 # --- Motor Control Functions ---
 def move_forward(speed):
-    in1.on(); in2.off()
-    in3.off(); in4.on()
-    ena.value = speed
-    enb.value = speed
-    green_led1.on()
-    green_led2.on()
-    print(f"Action: Forward at {speed:.2f}")
+    drive.set_velocity(speed, 0.0, "forward")
 
 def move_backward(speed):
-    in1.off(); in2.on()
-    in3.on(); in4.off()
-    ena.value = speed
-    enb.value = speed
-    red_led1.on()
-    red_led2.on()
-    print(f"Action: Backward at {speed:.2f}")
+    drive.set_velocity(-speed, 0.0, "backward")
 
 def turn_left(speed):
-    in1.on(); in2.off()
-    in3.off(); in4.off()
-    ena.value = speed
-    enb.value = 0.0
-    green_led1.off()
-    green_led2.off()
-    red_led1.off()
-    red_led2.off()
-    print(f"Action: Left (L:{speed:.2f}, R:0.0)")
+    inner = speed * TURN_INNER_SPEED_RATIO
+    drive.set_velocity((speed + inner) / 2, (speed - inner) / 2, "left")
 
 def turn_right(speed):
-    in1.off(); in2.off()
-    in3.off(); in4.on()
-    ena.value = 0.0
-    enb.value = speed
-    green_led1.off()
-    green_led2.off()
-    red_led1.off()
-    red_led2.off()
-    print(f"Action: Right (L:0.0, R:{speed:.2f})")
+    inner = speed * TURN_INNER_SPEED_RATIO
+    drive.set_velocity((speed + inner) / 2, -(speed - inner) / 2, "right")
 
 def stop_motors():
-    in1.off(); in2.off()
-    in3.off(); in4.off()
-    ena.off()
-    enb.off()
-    green_led1.off()
-    green_led2.off()
-    red_led1.off()
-    red_led2.off()
-    print("Action: Stop")
+    drive.set_velocity(0.0, 0.0, "stop")
+
+# --- Deadline Scheduler ---
+class DeadlineScheduler:
+    """One thread that runs timed steps, with one pending plan per actuator.
+
+    A plan is a list of (action, duration) steps: the first action runs
+    straight away, each following one when the previous duration has
+    elapsed, and a step with duration None ends the plan. Scheduling a new
+    plan for an actuator replaces whatever was still pending for it, so an
+    older command can never stop a newer one half way through. The clock is
+    injectable and `run_due()` can be driven by hand to check timing.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._cond = threading.Condition(threading.RLock())
+        self._plans = {}       # actuator -> deque of remaining (action, duration) steps
+        self._deadlines = {}   # actuator -> when the next step is due
+
+    def schedule(self, actuator, steps):
+        with self._cond:
+            self._plans[actuator] = deque(steps)
+            self._deadlines.pop(actuator, None)
+            self._advance(actuator)
+            self._cond.notify()
+
+    def cancel(self, actuator):
+        with self._cond:
+            self._plans.pop(actuator, None)
+            self._deadlines.pop(actuator, None)
+            self._cond.notify()
+
+    def pending(self, actuator):
+        with self._cond:
+            return actuator in self._plans
+
+    def _advance(self, actuator):
+        plan = self._plans.get(actuator)
+        if not plan:
+            self._plans.pop(actuator, None)
+            return
+        action, duration = plan.popleft()
+        if duration is None or not plan:
+            self._plans.pop(actuator, None)
+            self._deadlines.pop(actuator, None)
+        else:
+            self._deadlines[actuator] = self.clock() + duration
+        action()
+
+    def run_due(self):
+        """Run every step whose deadline has passed; returns seconds until the next one."""
+        with self._cond:
+            now = self.clock()
+            for actuator, deadline in list(self._deadlines.items()):
+                if deadline <= now:
+                    del self._deadlines[actuator]
+                    self._advance(actuator)
+            if not self._deadlines:
+                return None
+            return max(0.0, min(self._deadlines.values()) - self.clock())
+
+    def run(self):
+        with self._cond:
+            while True:
+                self._cond.wait(self.run_due())
+
+command_scheduler = DeadlineScheduler()
+scheduler_thread = threading.Thread(target=command_scheduler.run, daemon=True)
+scheduler_thread.start()
 
 # --- Timed Command Execution for Voice ---
-def execute_timed_command(command):
+VOICE_ACTIONS = {
+    "front": lambda: move_forward(MAX_PWM_SPEED),
+    "back": lambda: move_backward(MAX_PWM_SPEED),
+    "left": lambda: turn_left(MAX_PWM_SPEED),
+    "right": lambda: turn_right(MAX_PWM_SPEED),
+    "stop": stop_motors,
+}
+
+def execute_voice_sequence(steps):
+    """Run [(command, duration), ...] back to back, then stop."""
     if current_control_mode != 'speech_recognition':
         return
-    if command == "front":
-        move_forward(MAX_PWM_SPEED)
-    elif command == "back":
-        move_backward(MAX_PWM_SPEED)
-    elif command == "left":
-        turn_left(MAX_PWM_SPEED)
-    elif command == "right":
-        turn_right(MAX_PWM_SPEED)
-    elif command == "stop":
-        stop_motors()
-    if command != "stop":
-        threading.Timer(COMMAND_DURATION, stop_motors).start()
-
-# --- Obstacle Detection Thread ---
-def obstacle_detection_thread():
-    global obstacle_warning
-    while True:
-        if obstacle_detection_active:
-            distance = distance_sensor.distance * 100  # Convert to cm
-            if distance < 20:
-                buzzer.on()  # Continuous beep
-                obstacle_warning = True
+    plan = []
+    for command, duration in steps:
+        if command == "stop":
+            break
+        plan.append((VOICE_ACTIONS[command], duration))
+    plan.append((stop_motors, None))
+    command_scheduler.schedule('drive', plan)
+
+def execute_timed_command(command, duration=COMMAND_DURATION):
+    execute_voice_sequence([(command, duration)])
+
+# --- Obstacle Monitor ---
+SONAR_MAX_DISTANCE_CM = 400
+SPEED_OF_SOUND_CM_S = 34326
+OBSTACLE_WARN_DISTANCE_CM = 20
+OBSTACLE_CLEAR_DISTANCE_CM = 25       # Hysteresis: warning clears only beyond this
+OBSTACLE_WARN_TTC = 0.6               # Seconds to collision that also raise the warning
+OBSTACLE_CLEAR_TTC = 1.0
+OBSTACLE_MEDIAN_WINDOW = 5
+OBSTACLE_RESET_MISSES = 3             # Echo timeouts in a row before the filters restart
+OBSTACLE_CONFIRM_SAMPLES = 2          # Raw readings in a row under the warning distance that skip the filters
+OBSTACLE_EMA_ALPHA = 0.5
+OBSTACLE_SPEED_ALPHA = 0.3
+OBSTACLE_FAST_INTERVAL = 0.05         # Car moving or something approaching
+OBSTACLE_SLOW_INTERVAL = 0.25         # Car idle and nothing approaching
+OBSTACLE_CONFIRM_INTERVAL = 0.025     # Re-ping to confirm a close reading; past the max-range echo time
+OBSTACLE_APPROACH_SPEED_CM_S = 5
+
+ObstacleReading = namedtuple('ObstacleReading', ['timestamp', 'distance_cm', 'closing_speed_cm_s',
+                                                 'time_to_collision', 'warning', 'close_since'])
+
+class EchoRanger:
+    """HC-SR04 driver that times the echo pulse from pin edge callbacks.
+
+    The echo pin reports both edges with the pin factory's tick counter, so
+    the measured pulse does not depend on how quickly a thread gets
+    scheduled. With MockFactory the echo pin can be driven from a script to
+    reproduce any echo timing.
+    """
+
+    def __init__(self, trigger, echo, max_distance_cm=SONAR_MAX_DISTANCE_CM):
+        self.trigger = trigger
+        self.echo = echo
+        self.max_distance_cm = max_distance_cm
+        self._rise = None
+        self._fall = None
+        self._done = threading.Event()
+        echo.pin.edges = 'both'
+        echo.pin.bounce = None
+        echo.pin.when_changed = self._echo_changed
+
+    def _echo_changed(self, ticks, state):
+        if state:
+            self._rise = ticks
+        elif self._rise is not None:
+            self._fall = ticks
+            self._done.set()
+
+    def ping(self):
+        """Return the measured distance in cm, or None if no echo came back."""
+        self._rise = None
+        self._done.clear()
+        self.trigger.pin.state = True
+        time.sleep(0.00001)
+        self.trigger.pin.state = False
+        timeout = 2 * self.max_distance_cm / SPEED_OF_SOUND_CM_S + 0.01
+        if not self._done.wait(timeout):
+            return None
+        pulse = self.echo.pin_factory.ticks_diff(self._fall, self._rise)
+        return pulse * SPEED_OF_SOUND_CM_S / 2
+
+class ObstacleMonitor:
+    """Filters sonar readings and publishes them to subscribers.
+
+    Raw distances go through a median window (to reject single bad echoes)
+    and an EMA, and the closing speed is derived from successive filtered
+    distances. The warning uses hysteresis on both the distance and the
+    time-to-collision estimate. Sampling speeds up while the car is moving
+    or something is approaching and slows down when everything is idle.
+    A lost echo keeps the last reading; only OBSTACLE_RESET_MISSES in a row
+    restart the filters, and the first reading after that never warns.
+
+    Something that suddenly appears close would take several samples to
+    get through the median and the EMA, so once OBSTACLE_CONFIRM_SAMPLES
+    raw readings in a row are under the warning distance, the filters are
+    skipped and the farthest of them is taken as the distance. A single bad
+    echo is still rejected. `close_since` is the time of the first of those
+    raw readings, so brake latency can be measured from it.
+    """
+
+    def __init__(self, ranger, is_moving=lambda: False, clock=time.monotonic):
+        self.ranger = ranger
+        self.is_moving = is_moving
+        self.clock = clock
+        self.latest = None
+        self._window = deque(maxlen=OBSTACLE_MEDIAN_WINDOW)
+        self._close_run = []   # (timestamp, raw cm) of consecutive raw readings under the warning distance
+        self._misses = 0
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def update(self, raw_distance_cm, now):
+        previous = self.latest
+        if raw_distance_cm is None:
+            self._misses += 1
+            if previous is not None and self._misses < OBSTACLE_RESET_MISSES:
+                # One lost echo says nothing new: keep the last reading and its warning.
+                self.latest = previous._replace(timestamp=now)
             else:
-                buzzer.off()
-                obstacle_warning = False
+                # Nothing within range. Restart the filters so that coming back into
+                # range is not mistaken for something rushing towards the car.
+                self._window.clear()
+                self._close_run = []
+                self.latest = ObstacleReading(now, self.ranger.max_distance_cm, 0.0, float('inf'), False, None)
         else:
-            buzzer.off()
-            obstacle_warning = False
-        time.sleep(0.1)
-
-obstacle_thread = threading.Thread(target=obstacle_detection_thread, daemon=True)
+            self._misses = 0
+            if raw_distance_cm < OBSTACLE_WARN_DISTANCE_CM:
+                self._close_run.append((now, raw_distance_cm))
+            else:
+                self._close_run = []
+            close_since = self._close_run[0][0] if self._close_run else None
+            self._window.append(raw_distance_cm)
+            median = sorted(self._window)[len(self._window) // 2]
+            if previous is None or len(self._window) == 1:
+                # First reading after a (re)start: a single echo never raises the warning.
+                self.latest = ObstacleReading(now, median, 0.0, float('inf'), False, close_since)
+            else:
+                if len(self._close_run) >= OBSTACLE_CONFIRM_SAMPLES:
+                    distance = max(cm for _, cm in self._close_run[-OBSTACLE_CONFIRM_SAMPLES:])
+                    closing_speed = previous.closing_speed_cm_s
+                else:
+                    distance = OBSTACLE_EMA_ALPHA * median + (1 - OBSTACLE_EMA_ALPHA) * previous.distance_cm
+                    dt = now - previous.timestamp
+                    closing_speed = previous.closing_speed_cm_s
+                    if dt > 0:
+                        instant_speed = (previous.distance_cm - distance) / dt
+                        closing_speed = OBSTACLE_SPEED_ALPHA * instant_speed + (1 - OBSTACLE_SPEED_ALPHA) * closing_speed
+                time_to_collision = distance / closing_speed if closing_speed > 0 else float('inf')
+                if previous.warning:
+                    warning = distance < OBSTACLE_CLEAR_DISTANCE_CM or time_to_collision < OBSTACLE_CLEAR_TTC
+                else:
+                    warning = distance < OBSTACLE_WARN_DISTANCE_CM or time_to_collision < OBSTACLE_WARN_TTC
+                self.latest = ObstacleReading(now, distance, closing_speed, time_to_collision, warning, close_since)
+        for callback in self._subscribers:
+            callback(self.latest)
+        return self.latest
+
+    def next_interval(self):
+        reading = self.latest
+        if 0 < len(self._close_run) < OBSTACLE_CONFIRM_SAMPLES:
+            return OBSTACLE_CONFIRM_INTERVAL
+        if self.is_moving() or self._close_run or (
+                reading is not None and reading.closing_speed_cm_s > OBSTACLE_APPROACH_SPEED_CM_S):
+            return OBSTACLE_FAST_INTERVAL
+        return OBSTACLE_SLOW_INTERVAL
+
+    def run(self):
+        while True:
+            sample_time = self.clock()
+            raw_distance_cm = self.ranger.ping()
+            self.update(raw_distance_cm, sample_time)
+            time.sleep(self.next_interval())
+
+def car_is_moving():
+    command = motor_output.current()
+    return command is not None and (command.ena > 0 or command.enb > 0)
+
+def on_obstacle_reading(reading):
+    # The buzzer and warning only sound in the modes with obstacle detection,
+    # but the interlock brakes in every mode, so its state is always published.
+    global obstacle_warning
+    warning = obstacle_detection_active and reading.warning
+    obstacle_warning = warning
+    telemetry.publish('obstacle', {'warning': warning, 'blocked': motor_output.forward_blocked})
+    if buzzer.value != warning:
+        buzzer.value = warning  # Continuous beep while too close
+
+# --- Emergency Brake ---
+# Runs in every control mode, independently of the buzzer/warning display. The
+# brake is applied from the sonar thread as soon as a reading raises the
+# warning; for something that appears suddenly that is the second raw reading
+# under the warning distance, taken OBSTACLE_CONFIRM_INTERVAL after the first.
+brake_latency_ms = deque(maxlen=100)  # First raw reading under the warning distance -> motors stopped
+brake_stats = {'brakes': 0}
+
+def on_obstacle_brake(reading):
+    if reading.warning == motor_output.forward_blocked:
+        return
+    if motor_output.set_forward_blocked(reading.warning):
+        drive.halt()
+        started = reading.close_since if reading.close_since is not None else reading.timestamp
+        latency_ms = (time.monotonic() - started) * 1000
+        brake_latency_ms.append(latency_ms)
+        brake_stats['brakes'] += 1
+        log.warning("Emergency brake at %.1f cm", reading.distance_cm,
+                    extra={'fields': {'action': 'brake', 'latency_ms': round(latency_ms, 1)}})
+
+if SIMULATED:
+    # MockFactory output pins do not report edges, so the simulated sonar
+    # watches the trigger itself and drives the echo pin.
+    sonar_trigger = pi5car_sim.SonarTrigger(sonar_echo.pin, SIM_OBSTACLE_CM)
+obstacle_monitor = ObstacleMonitor(EchoRanger(sonar_trigger, sonar_echo), is_moving=car_is_moving)
+obstacle_monitor.subscribe(on_obstacle_brake)
+obstacle_monitor.subscribe(on_obstacle_reading)
+obstacle_thread = threading.Thread(target=obstacle_monitor.run, daemon=True)
 obstacle_thread.start()
 
+# --- Gesture Result Cache ---
+# The GestureRecognizer result already carries the hand landmarks, so the video
+# overlay reuses it instead of running a second MediaPipe pass per frame.
+GESTURE_OVERLAY_MAX_AGE = 15  # Frames after which a cached result is not drawn
+
+GestureResult = namedtuple('GestureResult', ['seq', 'hand_landmarks'])
+latest_gesture_result = GestureResult(0, [])
+
+def cache_gesture_result(seq, hand_landmarks):
+    global latest_gesture_result
+    latest_gesture_result = GestureResult(seq, hand_landmarks)
+
+def draw_gesture_overlay(frame):
+    if frame.image is None:
+        return None
+    image = frame.image.copy()
+    cached = latest_gesture_result
+    if frame.seq - cached.seq > GESTURE_OVERLAY_MAX_AGE:
+        return image
+    height, width = image.shape[:2]
+    for hand_landmarks in cached.hand_landmarks:
+        if mp is None:  # Simulated backend without MediaPipe: plain dots
+            for landmark in hand_landmarks:
+                cv2.circle(image, (int(landmark.x * width), int(landmark.y * height)), 4, (0, 0, 255), -1)
+            continue
+        landmark_list = landmark_pb2.NormalizedLandmarkList()
+        landmark_list.landmark.extend([
+            landmark_pb2.NormalizedLandmark(x=landmark.x, y=landmark.y, z=landmark.z)
+            for landmark in hand_landmarks
+        ])
+        mp_drawing.draw_landmarks(
+            image,
+            landmark_list,
+            mp_hands.HAND_CONNECTIONS,
+            mp_drawing_styles.get_default_hand_landmarks_style(),
+            mp_drawing_styles.get_default_hand_connections_style()
+        )
+    return image
+
+# --- Gesture Voting ---
+# A single misread frame must not start a 0.9 s turn and the stop after it,
+# so per-frame results only commit a command once enough evidence has built
+# up. Every frame votes for the command its gesture maps to, weighted by how
+# far its score clears GESTURE_VOTE_MIN_SCORE, and a command is committed
+# when its votes within the window add up to GESTURE_VOTE_THRESHOLD: two
+# frames at 0.75 or better, three at 0.7, five at 0.6. A frame with no hand
+# at all is a full-weight vote for "none". Only inferred frames vote: while
+# a vote is still waiting for more evidence the motion gate lets every frame
+# through, since a still scene repeating one misread is no extra evidence.
+GESTURE_VOTING = True
+GESTURE_VOTE_WINDOW = 0.5       # Seconds of frames whose votes are added up
+GESTURE_VOTE_MIN_SCORE = 0.5    # Scores at or below this carry no weight
+GESTURE_VOTE_THRESHOLD = 1.0    # Added-up weight that commits a command (1.0 = one perfect frame)
+
+GESTURE_COMMANDS = {
+    "Thumb_Up": "turn_left",
+    "Thumb_Down": "turn_right",
+    "Victory": "stop",
+}
+
+def gesture_vote(result):
+    """The command `result` stands for and the score behind it."""
+    if not result.gestures:
+        return "none", 1.0
+    category = result.gestures[0][0]
+    return GESTURE_COMMANDS.get(category.category_name, "none"), category.score
+
+class GestureVoter:
+    """Commits gesture commands from confidence-weighted votes in a sliding window.
+
+    Votes are timestamped with the frame's capture time, so a recorded clip
+    can be replayed in frame time. With voting disabled every vote commits
+    at once, which is the plain per-frame behaviour. `settled` is False
+    while the latest vote disagrees with the committed command.
+    """
+
+    def __init__(self, enabled=GESTURE_VOTING, window=GESTURE_VOTE_WINDOW,
+                 threshold=GESTURE_VOTE_THRESHOLD, min_score=GESTURE_VOTE_MIN_SCORE):
+        self.enabled = enabled
+        self.window = window
+        self.threshold = threshold
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._votes = deque()   # (timestamp, command, weight)
+            self._last_command = "none"
+            self.command = "none"
+
+    @property
+    def settled(self):
+        return self._last_command == self.command
+
+    def weight(self, score):
+        return max(0.0, (score - self.min_score) / (1.0 - self.min_score))
+
+    def vote(self, command, score, timestamp):
+        """Add one frame's vote; returns the committed command."""
+        with self._lock:
+            self._last_command = command
+            if not self.enabled:
+                self.command = command
+                return command
+            self._votes.append((timestamp, command, self.weight(score)))
+            while self._votes[0][0] <= timestamp - self.window:
+                self._votes.popleft()
+            evidence = sum(weight for _, voted, weight in self._votes if voted == command)
+            # Tolerance for float rounding, so five votes at 0.6 do reach 1.0.
+            if evidence >= self.threshold - 1e-9:
+                self.command = command
+            return self.command
+
+gesture_voter = GestureVoter()
+
 # --- Gesture Recognition Thread ---
-def gesture_recognition_thread():
+# Bumped whenever current_gesture_command changes (or the mode switches) so the
+# car control thread only wakes up when there is something to react to.
+gesture_event = threading.Condition()
+gesture_event_count = 0
+
+def notify_gesture_event():
+    global gesture_event_count
+    with gesture_event:
+        gesture_event_count += 1
+        gesture_event.notify_all()
+
+gesture_stats = {
+    'frames_inferred': 0,
+    'frames_dropped': 0,
+    'frames_tracked': 0,    # Inferred on a crop around the tracked hand
+    'frames_full': 0,       # Inferred on the whole frame
+    'frames_skipped': 0,    # Scene unchanged, previous result reused
+    'commands_committed': 0,  # Changes of current_gesture_command
+}
+gesture_latency_ms = deque(maxlen=100)  # Frame capture -> gesture command
+gesture_inference_ms = deque(maxlen=100)  # Recognizer call (or async round trip) per frame
+gesture_inflight = {}  # Async timestamp_ms -> (frame seq, capture time, region, frame size, submit time)
+gesture_inflight_lock = threading.Lock()
+
+def gesture_input(frame):
+    """Crop the frame for the hand tracker and wrap it as an RGB mp.Image."""
+    image, region = hand_tracker.crop(frame.image)
+    gesture_stats['frames_tracked' if region is not None else 'frames_full'] += 1
+    rgb_frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    frame_size = (frame.image.shape[1], frame.image.shape[0])
+    return as_mp_image(rgb_frame), region, frame_size
+
+def update_gesture_command(frame_seq, capture_time, result, region, frame_size, inference_ms):
+    hand_landmarks = HandTracker.to_frame(result.hand_landmarks, region, *frame_size)
+    hand_tracker.update(hand_landmarks, *frame_size)
+    cache_gesture_result(frame_seq, hand_landmarks)
+    gesture_inference_ms.append(inference_ms)
+    set_gesture_command(gesture_voter.vote(*gesture_vote(result), capture_time))
+    gesture_stats['frames_inferred'] += 1
+    gesture_latency_ms.append((time.monotonic() - capture_time) * 1000)
+
+def set_gesture_command(command):
     global current_gesture_command
+    if command != current_gesture_command:
+        current_gesture_command = command
+        gesture_stats['commands_committed'] += 1
+        notify_gesture_event()
+
+def gesture_result_callback(result, output_image, timestamp_ms):
+    with gesture_inflight_lock:
+        pending = gesture_inflight.pop(timestamp_ms, None)
+    if pending is not None:
+        frame_seq, capture_time, region, frame_size, submitted = pending
+        update_gesture_command(frame_seq, capture_time, result, region, frame_size,
+                               (time.monotonic() - submitted) * 1000)
+
+def skip_frame(frame):
+    """True if `frame` is not inferred: the scene is unchanged, or it does not decode."""
+    thumbnail = frame_thumbnail(frame)
+    if thumbnail is not None and not motion_gate.should_infer(thumbnail, force=not gesture_voter.settled):
+        gesture_stats['frames_skipped'] += 1
+        # Keep the reused landmarks fresh enough for the overlay.
+        cache_gesture_result(frame.seq, latest_gesture_result.hand_landmarks)
+        return True
+    if thumbnail is None or frame.image is None:
+        # A corrupt or truncated JPEG is dropped like a frame the recognizer had no time for.
+        gesture_stats['frames_dropped'] += 1
+        return True
+    return False
+
+def gesture_recognition_thread():
+    last_seq = 0
+    last_timestamp_ms = 0
+    busy_since = 0.0
     while True:
         if gesture_active:
-            success, frame = camera.read()
-            if success:
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
-                result = gesture_recognizer.recognize(mp_image)
-                if result.gestures:
-                    category_name = result.gestures[0][0].category_name
-                    if category_name == "Thumb_Up":
-                        current_gesture_command = "turn_left"
-                    elif category_name == "Thumb_Down":
-                        current_gesture_command = "turn_right"
-                    elif category_name == "Victory":
-                        current_gesture_command = "stop"
-                    else:
-                        current_gesture_command = "none"
-                else:
-                    current_gesture_command = "none"
+            frame = frame_ring.wait_newer(last_seq)
+            if frame is not None:
+                last_seq = frame.seq
+                try:
+                    if GESTURE_RUNNING_MODE == 'live_stream':
+                        with gesture_inflight_lock:
+                            if gesture_inflight and time.monotonic() - busy_since < GESTURE_INFERENCE_TIMEOUT:
+                                gesture_stats['frames_dropped'] += 1
+                                continue
+                        # Gate only once the recognizer is free, so the reference
+                        # thumbnail is always a frame that really was inferred.
+                        if skip_frame(frame):
+                            continue
+                        with gesture_inflight_lock:
+                            gesture_inflight.clear()
+                            # MediaPipe rejects timestamps that do not strictly increase.
+                            timestamp_ms = max(int(frame.timestamp * 1000), last_timestamp_ms + 1)
+                            last_timestamp_ms = timestamp_ms
+                            busy_since = time.monotonic()
+                        mp_image, region, frame_size = gesture_input(frame)
+                        with gesture_inflight_lock:
+                            gesture_inflight[timestamp_ms] = (frame.seq, frame.timestamp, region, frame_size,
+                                                              time.monotonic())
+                        gesture_recognizer.recognize_async(mp_image, timestamp_ms)
+                        continue
+                    if not skip_frame(frame):
+                        mp_image, region, frame_size = gesture_input(frame)
+                        started = time.monotonic()
+                        result = gesture_recognizer.recognize(mp_image)
+                        update_gesture_command(frame.seq, frame.timestamp, result, region, frame_size,
+                                               (time.monotonic() - started) * 1000)
+                except Exception as e:
+                    # One bad frame must not end gesture control for good.
+                    log.exception("Gesture recognition failed on frame %d: %s", frame.seq, e)
+        else:
+            hand_tracker.reset()
+            motion_gate.reset()
+            gesture_voter.reset()
         time.sleep(0.1)
 
+init_gesture_recognizer()
+
 gesture_recognition_thread = threading.Thread(target=gesture_recognition_thread, daemon=True)
 gesture_recognition_thread.start()
 
 # --- Gesture Car Control Thread ---
-def gesture_car_control_thread():
-    current_state = STATE_STOPPED
-    state_start_time = time.time()
-    stop_duration = 0
-    last_command = "none"
+class GestureStateMachine:
+    """Forward / turning / stopped state machine driven by gesture commands.
+
+    `step()` is called whenever a new gesture arrives or the current state's
+    deadline expires and returns the state it moved to, or None if nothing
+    changed. The clock is injectable so transitions can be checked without
+    waiting in real time.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.state = STATE_STOPPED
+        self.deadline = self.clock()
+        self.last_command = "none"
+
+    def time_until_deadline(self):
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - self.clock())
+
+    def _enter(self, state, duration):
+        self.state = state
+        self.deadline = None if duration is None else self.clock() + duration
+        return state
+
+    def step(self, command):
+        if self.state == STATE_FORWARD:
+            if command != self.last_command and command != "none":
+                if command == "turn_left":
+                    self.last_command = command
+                    return self._enter(STATE_TURNING_LEFT, TURN_DURATION)
+                elif command == "turn_right":
+                    self.last_command = command
+                    return self._enter(STATE_TURNING_RIGHT, TURN_DURATION)
+                elif command == "stop":
+                    self.last_command = command
+                    return self._enter(STATE_STOPPED, STOP_DURATION_VICTORY)
+            return None
+        if self.clock() < self.deadline:
+            return None
+        if self.state in (STATE_TURNING_LEFT, STATE_TURNING_RIGHT):
+            return self._enter(STATE_STOPPED, STOP_DURATION_AFTER_TURN)
+        return self._enter(STATE_FORWARD, None)
+
+def apply_gesture_state(state):
+    if state == STATE_FORWARD:
+        move_forward(BASE_SPEED)
+    elif state == STATE_TURNING_LEFT:
+        turn_left(TURN_SPEED)
+    elif state == STATE_TURNING_RIGHT:
+        turn_right(TURN_SPEED)
+    else:
+        stop_motors()
 
+def gesture_car_control_thread():
+    machine = GestureStateMachine()
+    seen_events = 0
+    was_active = False
     while True:
-        if gesture_active:
-            command = current_gesture_command
-            if current_state == STATE_FORWARD:
-                if command != last_command and command != "none":
-                    if command == "turn_left":
-                        current_state = STATE_TURNING_LEFT
-                        turn_left(TURN_SPEED)
-                        state_start_time = time.time()
-                        last_command = command
-                    elif command == "turn_right":
-                        current_state = STATE_TURNING_RIGHT
-                        turn_right(TURN_SPEED)
-                        state_start_time = time.time()
-                        last_command = command
-                    elif command == "stop":
-                        current_state = STATE_STOPPED
-                        stop_motors()
-                        stop_duration = STOP_DURATION_VICTORY
-                        state_start_time = time.time()
-                        last_command = command
-                else:
-                    move_forward(BASE_SPEED)
-            elif current_state == STATE_TURNING_LEFT:
-                if time.time() - state_start_time >= TURN_DURATION:
-                    current_state = STATE_STOPPED
-                    stop_motors()
-                    stop_duration = STOP_DURATION_AFTER_TURN
-                    state_start_time = time.time()
-            elif current_state == STATE_TURNING_RIGHT:
-                if time.time() - state_start_time >= TURN_DURATION:
-                    current_state = STATE_STOPPED
-                    stop_motors()
-                    stop_duration = STOP_DURATION_AFTER_TURN
-                    state_start_time = time.time()
-            elif current_state == STATE_STOPPED:
-                if time.time() - state_start_time >= stop_duration:
-                    current_state = STATE_FORWARD
-                    move_forward(BASE_SPEED)
-        time.sleep(0.1)
+        with gesture_event:
+            timeout = machine.time_until_deadline() if was_active else None
+            gesture_event.wait_for(lambda: gesture_event_count != seen_events, timeout)
+            seen_events = gesture_event_count
+        if not gesture_active:
+            was_active = False
+            continue
+        if not was_active:
+            machine.reset()
+            was_active = True
+        new_state = machine.step(current_gesture_command)
+        if new_state is not None:
+            apply_gesture_state(new_state)
 
 gesture_control_thread = threading.Thread(target=gesture_car_control_thread, daemon=True)
 gesture_control_thread.start()
 
 # --- Controller Thread ---
-controller_state = {
-    'forward': False,
-    'backward': False,
-    'left': False,
-    'right': False
-}
-
-def find_pro_controller():
+CONTROLLER_CONTROL_HZ = 50        # Rate at which the latest stick state becomes the drive setpoint
+CONTROLLER_STICK_DEADZONE = 0.15
+CONTROLLER_INVERT_Y = True        # The Pro Controller reports stick-up as negative ABS_Y
+BTN_ZR = 313
+BTN_ZL = 312
+
+class ControllerFrameDecoder:
+    """Folds evdev events into one controller state per SYN_REPORT frame.
+
+    Buttons, D-pad and stick events only update a pending copy; `state` is
+    replaced as a whole when the frame is complete, so the control loop
+    never sees half of a frame. After SYN_DROPPED the pending state is
+    rebuilt from the device instead of the lost events.
+    """
+
+    def __init__(self, abs_ranges=None):
+        self.state = {'zr': False, 'zl': False, 'hat_x': 0, 'stick_x': 0.0, 'stick_y': 0.0}
+        self.abs_ranges = abs_ranges or {}
+        self.frames = 0
+        self.events = 0
+        self.needs_resync = False
+        self._pending = dict(self.state)
+
+    def normalize(self, code, value):
+        low, high = self.abs_ranges.get(code, (-32767, 32767))
+        position = (value - (low + high) / 2) / ((high - low) / 2)
+        position = max(-1.0, min(1.0, position))
+        if abs(position) < CONTROLLER_STICK_DEADZONE:
+            return 0.0
+        scaled = (abs(position) - CONTROLLER_STICK_DEADZONE) / (1 - CONTROLLER_STICK_DEADZONE)
+        return scaled if position > 0 else -scaled
+
+    def feed(self, event):
+        """Process one event; returns True when it completed a frame."""
+        self.events += 1
+        if event.type == ecodes.EV_SYN:
+            if event.code == ecodes.SYN_DROPPED:
+                self.needs_resync = True
+            elif event.code == ecodes.SYN_REPORT and not self.needs_resync:
+                self.state = dict(self._pending)
+                self.frames += 1
+                return True
+            return False
+        if event.type == ecodes.EV_KEY:
+            if event.code == BTN_ZR:
+                self._pending['zr'] = event.value != 0
+            elif event.code == BTN_ZL:
+                self._pending['zl'] = event.value != 0
+        elif event.type == ecodes.EV_ABS:
+            if event.code == ecodes.ABS_HAT0X:  # D-pad Horizontal
+                self._pending['hat_x'] = event.value
+            elif event.code == ecodes.ABS_X:
+                self._pending['stick_x'] = self.normalize(event.code, event.value)
+            elif event.code == ecodes.ABS_Y:
+                self._pending['stick_y'] = self.normalize(event.code, event.value)
+        return False
+
+    def resync(self, device):
+        keys = device.active_keys()
+        self._pending['zr'] = BTN_ZR in keys
+        self._pending['zl'] = BTN_ZL in keys
+        capabilities = device.capabilities().get(ecodes.EV_ABS, [])
+        codes = {code for code, _ in capabilities}
+        if ecodes.ABS_HAT0X in codes:
+            self._pending['hat_x'] = device.absinfo(ecodes.ABS_HAT0X).value
+        for code, key in ((ecodes.ABS_X, 'stick_x'), (ecodes.ABS_Y, 'stick_y')):
+            if code in codes:
+                self._pending[key] = self.normalize(code, device.absinfo(code).value)
+        self.state = dict(self._pending)
+        self.needs_resync = False
+
+def read_abs_ranges(device):
+    ranges = {}
+    for code, info in device.capabilities().get(ecodes.EV_ABS, []):
+        ranges[code] = (info.min, info.max)
+    return ranges
+
+def controller_velocity(state):
+    """Map a controller state to a (linear, angular) drive setpoint.
+
+    ZR/ZL give full forward/backward, otherwise the left stick sets a
+    proportional throttle. The stick (or the D-pad) steers by speeding up
+    one side and slowing the other. The D-pad on its own still turns like
+    the original controls.
+    """
+    if state['zr']:
+        throttle = 1.0
+    elif state['zl']:
+        throttle = -1.0
+    else:
+        throttle = -state['stick_y'] if CONTROLLER_INVERT_Y else state['stick_y']
+    steer = state['stick_x'] if state['stick_x'] else float(state['hat_x'])
+    if throttle == 0 and not state['stick_x'] and state['hat_x']:
+        inner = TURN_INNER_SPEED_RATIO * MAX_PWM_SPEED
+        linear = (MAX_PWM_SPEED + inner) / 2
+        return linear, linear - inner if state['hat_x'] < 0 else inner - linear
+    return throttle * MAX_PWM_SPEED, -steer * MAX_PWM_SPEED
+
+# Vendor/product IDs of controllers seen before, so a reconnecting controller is
+# recognised by its IDs rather than by name. New IDs are cached to CONTROLLER_IDS_PATH,
+# in the per-user state directory rather than next to the code.
+STATE_DIR = os.environ.get('PI5CAR_STATE_DIR', os.path.join(
+    os.environ.get('XDG_STATE_HOME', os.path.expanduser('~/.local/state')), 'pi5car'))
+CONTROLLER_IDS_PATH = os.path.join(STATE_DIR, "controller_ids.json")
+DEFAULT_CONTROLLER_IDS = [(0x057e, 0x2009)]  # Nintendo Switch Pro Controller
+CONTROLLER_SETTLE_TIME = 0.2    # Let sibling nodes (the IMU device) appear after a hotplug event
+CONTROLLER_POLL_INTERVAL = 0.5  # /dev/input check interval when pyudev is unavailable
+
+controller_stats = {'connects': 0, 'disconnects': 0, 'hotplug_events': 0, 'watcher': None,
+                    'last_reconnect_ms': None}
+controller_reconnect_ms = deque(maxlen=50)
+
+def load_controller_ids(path=CONTROLLER_IDS_PATH):
+    try:
+        with open(path) as f:
+            return {tuple(ids) for ids in json.load(f)}
+    except (FileNotFoundError, ValueError):
+        return set(DEFAULT_CONTROLLER_IDS)
+
+def remember_controller_ids(device):
+    ids = (device.info.vendor, device.info.product)
+    if ids in controller_ids:
+        return
+    controller_ids.add(ids)
+    try:
+        os.makedirs(os.path.dirname(CONTROLLER_IDS_PATH), exist_ok=True)
+        with open(CONTROLLER_IDS_PATH, 'w') as f:
+            json.dump(sorted(controller_ids), f)
+    except OSError as e:
+        log.warning("Could not cache controller IDs to %s: %s", CONTROLLER_IDS_PATH, e)
+
+controller_ids = load_controller_ids()
+
+def is_pro_controller(device):
+    if (device.info.vendor, device.info.product) in controller_ids:
+        return True
+    if "Pro Controller" in device.name:
+        remember_controller_ids(device)
+        return True
+    return False
+
+def find_pro_controller(paths=None):
     found_controller = None
     found_imu_controller = None
-    for path in list_devices():
+    for path in list_devices() if paths is None else paths:
         try:
             device = InputDevice(path)
-            if "Pro Controller (IMU)" in device.name and "Pro Controller" in device.name:
+            if not is_pro_controller(device):
+                device.close()
+            elif "(IMU)" in device.name:
                 found_imu_controller = device
-            elif "Pro Controller" in device.name:
-                print(f"Found primary Nintendo Switch Pro Controller: {device.name} at {device.path}")
-                return device
             else:
-                device.close()
+                log.info("Found primary Nintendo Switch Pro Controller: %s at %s", device.name, device.path)
+                if found_imu_controller:
+                    found_imu_controller.close()
+                return device
         except OSError as e:
-            print(f"Warning: Could not open device {path} - {e}")
+            log.warning("Could not open device %s - %s", path, e)
             continue
     if found_imu_controller:
-        print(f"Found Pro Controller (IMU) as fallback: {found_imu_controller.name} at {found_imu_controller.path}")
+        log.info("Found Pro Controller (IMU) as fallback: %s at %s", found_imu_controller.name, found_imu_controller.path)
         return found_imu_controller
     return None
 
-def read_controller_input():
-    global nintendo_controller, controller_active
+class InputHotplugWatcher:
+    """Wakes the controller thread when new /dev/input event nodes appear.
+
+    With pyudev a netlink monitor is read from the asyncio loop, so a
+    reconnecting controller is picked up as soon as udev announces it.
+    Without it the /dev/input listing is compared every
+    CONTROLLER_POLL_INTERVAL seconds, which only lists paths instead of
+    opening every device.
+    """
+
+    def __init__(self):
+        self.monitor = None
+        self.known = set()
+        self._added = set()
+        self._wake = None
+
+    def start(self):
+        self._wake = asyncio.Event()
+        if pyudev is not None:
+            try:
+                self.monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+                self.monitor.filter_by('input')
+                self.monitor.start()
+                asyncio.get_running_loop().add_reader(self.monitor.fileno(), self._on_udev_event)
+            except (OSError, ValueError) as e:
+                log.warning("udev monitor unavailable (%s), polling /dev/input instead", e)
+                self.monitor = None
+        controller_stats['watcher'] = 'udev' if self.monitor is not None else 'poll'
+        self.reset()
+
+    def reset(self):
+        """Forget pending nodes; call right before a full scan."""
+        self.known = set(list_devices())
+        self._added.clear()
+        self._wake.clear()
+
+    def _on_udev_event(self):
+        device = self.monitor.poll(timeout=0)
+        while device is not None:
+            node = device.device_node or ''
+            if device.action == 'add' and node.startswith('/dev/input/event'):
+                self._added.add(node)
+                self._wake.set()
+            device = self.monitor.poll(timeout=0)
+
+    async def wait_for_new_devices(self):
+        """Returns the event node paths that appeared since the last call or reset."""
+        while True:
+            if self.monitor is not None:
+                await self._wake.wait()
+                await asyncio.sleep(CONTROLLER_SETTLE_TIME)
+                self._wake.clear()
+                added, self._added = self._added, set()
+            else:
+                await asyncio.sleep(CONTROLLER_POLL_INTERVAL)
+                current = set(list_devices())
+                added = current - self.known
+                self.known = current
+            if added:
+                controller_stats['hotplug_events'] += 1
+                return sorted(added)
+
+def publish_controller_status():
+    controller = nintendo_controller
+    if controller is not None:
+        telemetry.publish('controller', {'status': 'connected', 'name': controller.name,
+                                         'reconnect_ms': controller_stats['last_reconnect_ms']})
+    else:
+        telemetry.publish('controller', {'status': 'disconnected', 'name': 'N/A'})
+
+async def controller_drive_loop(decoder):
+    loop = asyncio.get_running_loop()
+    period = 1 / CONTROLLER_CONTROL_HZ
+    next_tick = loop.time()
+    while True:
+        if controller_active:
+            drive.set_velocity(*controller_velocity(decoder.state))
+        next_tick += period
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+async def controller_session(device):
+    decoder = ControllerFrameDecoder(read_abs_ranges(device))
+    decoder.resync(device)
+    drive_task = asyncio.create_task(controller_drive_loop(decoder))
+    try:
+        async for event in device.async_read_loop():
+            decoder.feed(event)
+            if decoder.needs_resync:
+                decoder.resync(device)
+    finally:
+        drive_task.cancel()
+
+def stop_if_controller_mode():
+    # Losing the controller must not stop the car while another mode drives it.
+    if controller_active:
+        stop_motors()
+
+async def wait_for_controller(watcher):
+    watcher.reset()
+    log.debug("Attempting to find Pro Controller...")
+    controller = find_pro_controller()
+    while controller is None:
+        log.info("Pro Controller not found. Waiting for it to connect (%s).", controller_stats['watcher'])
+        stop_if_controller_mode()
+        paths = await watcher.wait_for_new_devices()
+        controller = find_pro_controller(paths)
+    return controller
+
+async def controller_main():
+    global nintendo_controller
+    watcher = InputHotplugWatcher()
+    watcher.start()
+    lost_at = None
     while True:
         if nintendo_controller is None:
-            print("Attempting to find Pro Controller...")
-            nintendo_controller = find_pro_controller()
-            if nintendo_controller is None:
-                print("Pro Controller not found. Retrying in 3 seconds...")
-                stop_motors()
-                time.sleep(3)
-                continue
+            nintendo_controller = await wait_for_controller(watcher)
+            controller_stats['connects'] += 1
+            if lost_at is not None:
+                # Time from losing the controller until it is readable again.
+                reconnect_ms = (time.monotonic() - lost_at) * 1000
+                controller_reconnect_ms.append(reconnect_ms)
+                controller_stats['last_reconnect_ms'] = round(reconnect_ms, 1)
+                log.info("Controller reconnected after %.0f ms", reconnect_ms)
+            publish_controller_status()
 
         try:
-            print(f"Starting read loop for: {nintendo_controller.name} at {nintendo_controller.path}")
-            for event in nintendo_controller.read_loop():
-                if not controller_active:
-                    stop_motors()
-                    continue
-
-                if event.type == ecodes.EV_KEY:
-                    if event.code == 313:  # ZR
-                        controller_state['forward'] = (event.value == 1)
-                    elif event.code == 312:  # ZL
-                        controller_state['backward'] = (event.value == 1)
-                elif event.type == ecodes.EV_ABS:
-                    if event.code == 16:  # D-pad Horizontal
-                        if event.value == -1:  # Left
-                            controller_state['left'] = True
-                            controller_state['right'] = False
-                        elif event.value == 1:  # Right
-                            controller_state['right'] = True
-                            controller_state['left'] = False
-                        elif event.value == 0:  # Centered
-                            controller_state['left'] = False
-                            controller_state['right'] = False
-
-                if controller_active:
-                    if controller_state['forward']:
-                        move_forward(MAX_PWM_SPEED)
-                    elif controller_state['backward']:
-                        move_backward(MAX_PWM_SPEED)
-                    elif controller_state['left']:
-                        turn_left(MAX_PWM_SPEED)
-                    elif controller_state['right']:
-                        turn_right(MAX_PWM_SPEED)
-                    else:
-                        stop_motors()
-                else:
-                    stop_motors()
-
-        except FileNotFoundError:
-            print(f"Error: Controller device {nintendo_controller.path if nintendo_controller else 'N/A'} disconnected during read_loop. Attempting to re-find.")
-            nintendo_controller = None
-            stop_motors()
-            time.sleep(2)
+            log.info("Starting read loop for: %s at %s", nintendo_controller.name, nintendo_controller.path)
+            await controller_session(nintendo_controller)
+        except (FileNotFoundError, OSError) as e:
+            log.error("Controller device %s disconnected during read_loop (%s). Attempting to re-find.",
+                      nintendo_controller.path if nintendo_controller else 'N/A', e)
         except Exception as e:
-            print(f"An unexpected error occurred in controller input thread: {e}")
-            nintendo_controller = None
-            stop_motors()
-            time.sleep(2)
+            log.exception("An unexpected error occurred in controller input thread: %s", e)
+            # Back off so a device that fails straight away is not reopened in a tight loop.
+            await asyncio.sleep(1)
         finally:
             if nintendo_controller is not None:
                 try:
                     nintendo_controller.close()
-                    print(f"Closed controller device {nintendo_controller.path}")
+                    log.info("Closed controller device %s", nintendo_controller.path)
                 except Exception as e:
-                    print(f"Error closing controller device: {e}")
+                    log.error("Error closing controller device: %s", e)
             nintendo_controller = None
-            stop_motors()
-            print("Controller input thread lost connection or encountered an issue. Re-attempting to find controller.")
-            time.sleep(1)
+            lost_at = time.monotonic()
+            controller_stats['disconnects'] += 1
+            publish_controller_status()
+            stop_if_controller_mode()
+            log.info("Controller input thread lost connection or encountered an issue. Re-attempting to find controller.")
+
+def read_controller_input():
+    asyncio.run(controller_main())
 
 controller_thread = threading.Thread(target=read_controller_input, daemon=True)
 controller_thread.start()
 
+# --- Voice Command Aliases ---
+# Maps every phrase Vosk may hear to one of KNOWN_COMMANDS. The table is read
+# from VOICE_ALIASES_PATH at startup so it can be tuned without touching code.
+VOICE_ALIASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice_aliases.json")
+VOICE_MIN_CONFIDENCE = 0.6   # Vosk per-word confidence needed to act on a final result
+VOICE_FUZZY_PENALTY = 0.8    # Confidence multiplier for a match one edit away (only without the grammar)
+VOICE_FUZZY_MIN_LENGTH = 4   # Shorter words ("for", "not") are too easy to confuse
+
+VOICE_MAX_DURATION = 5.0     # Longest "for N seconds" a voice command may ask for
+VOICE_NUMBERS = {"half": 0.5, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+# Words for sequences like "left then front for one point five seconds". They
+# are part of the grammar but are never fuzzy-matched to a command.
+VOICE_SEQUENCE_WORDS = ["then", "for", "point", "and", "a", "second", "seconds"] + list(VOICE_NUMBERS)
+
+VoiceMatch = namedtuple('VoiceMatch', ['command', 'phrase', 'confidence', 'fuzzy', 'end'])
+
+def _single_deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+class VoiceCommandIndex:
+    """Lookup index compiled from the alias table.
+
+    Phrases are stored as word tuples, so matching an utterance costs at
+    most one dict lookup per word per phrase length. Words that are not an
+    alias are looked up in a table of single-character deletions (both of
+    the aliases and of the word), which catches one-edit misrecognitions in
+    constant time per word. With a Vosk grammar the recognizer can only
+    return grammar words or "[unk]", so nothing is ever one edit away and
+    the table is only built when `fuzzy` is on (VOSK_USE_GRAMMAR off).
+    """
+
+    def __init__(self, aliases, extra_words=(), fuzzy=True):
+        self.phrases = {}
+        self.deletes = {}
+        self.extra_words = set(extra_words)
+        for command, phrases in aliases.items():
+            if command not in KNOWN_COMMANDS:
+                log.warning("Ignoring voice aliases for unknown command '%s'", command)
+                continue
+            for phrase in phrases:
+                words = tuple(phrase.lower().split())
+                if not words:
+                    continue
+                self.phrases[words] = command
+                if fuzzy and len(words) == 1 and len(words[0]) >= VOICE_FUZZY_MIN_LENGTH:
+                    for variant in _single_deletes(words[0]) | {words[0]}:
+                        self.deletes.setdefault(variant, set()).add(command)
+        self.max_phrase_len = max((len(words) for words in self.phrases), default=1)
+
+    def grammar(self):
+        return [' '.join(words) for words in self.phrases] + sorted(self.extra_words) + ["[unk]"]
+
+    def _fuzzy(self, word):
+        if len(word) < VOICE_FUZZY_MIN_LENGTH or word in self.extra_words:
+            return None
+        commands = set()
+        for variant in _single_deletes(word) | {word}:
+            commands |= self.deletes.get(variant, set())
+        return commands.pop() if len(commands) == 1 else None
+
+    def match(self, words, confidences=None):
+        """Return every VoiceMatch in `words`, in the order they were spoken.
+
+        `confidences` holds Vosk's per-word confidence (None for partial
+        results, which are treated as fully confident). Matches below
+        VOICE_MIN_CONFIDENCE are logged as near misses and left out.
+        """
+        matches = []
+        i = 0
+        while i < len(words):
+            for length in range(min(self.max_phrase_len, len(words) - i), 0, -1):
+                phrase = tuple(words[i:i + length])
+                command = self.phrases.get(phrase)
+                fuzzy = False
+                if command is None and length == 1:
+                    command = self._fuzzy(phrase[0])
+                    fuzzy = command is not None
+                if command is None:
+                    continue
+                confidence = min(confidences[i:i + length]) if confidences else 1.0
+                if fuzzy:
+                    confidence *= VOICE_FUZZY_PENALTY
+                if confidence >= VOICE_MIN_CONFIDENCE:
+                    matches.append(VoiceMatch(command, ' '.join(phrase), confidence, fuzzy, i + length))
+                else:
+                    log.info("Voice near miss: '%s' -> %s at confidence %.2f", ' '.join(phrase), command, confidence,
+                             extra={'fields': {'phrase': ' '.join(phrase), 'command': command,
+                                               'confidence': round(confidence, 2), 'fuzzy': fuzzy}})
+                i += length
+                break
+            else:
+                if words[i] != "[unk]":
+                    log.debug("Voice word '%s' matches no alias", words[i])
+                i += 1
+        return matches
+
+def load_voice_aliases(path=VOICE_ALIASES_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        log.warning("Voice alias table %s not found, using bare command words", path)
+        return {command: [command] for command in KNOWN_COMMANDS}
+
+def parse_voice_duration(words):
+    """Read "[for] N [point N] [and a half] [seconds]" from the start of `words`."""
+    words = [word for word in words if word not in ("for", "a", "second", "seconds")]
+    if not words or words[0] not in VOICE_NUMBERS:
+        return None
+    seconds = VOICE_NUMBERS[words[0]]
+    rest = words[1:]
+    if len(rest) >= 2 and rest[0] == "point" and rest[1] in VOICE_NUMBERS and VOICE_NUMBERS[rest[1]] >= 1:
+        seconds += VOICE_NUMBERS[rest[1]] / 10
+    elif len(rest) >= 2 and rest[0] == "and" and rest[1] == "half":
+        seconds += 0.5
+    return min(seconds, VOICE_MAX_DURATION)
+
+def plan_voice_sequence(words, matches):
+    """Turn the matches of one utterance into [(command, duration), ...]."""
+    steps = []
+    for index, match in enumerate(matches):
+        following = matches[index + 1].end - len(matches[index + 1].phrase.split()) if index + 1 < len(matches) else len(words)
+        duration = parse_voice_duration(words[match.end:following])
+        steps.append((match.command, duration if duration is not None else COMMAND_DURATION))
+    return steps
+
+voice_index = VoiceCommandIndex(load_voice_aliases(), VOICE_SEQUENCE_WORDS, fuzzy=not VOSK_USE_GRAMMAR)
+
 # --- Speech Recognition Thread ---
+speech_event_count = 0
+
+def publish_speech_command(command):
+    global speech_event_count
+    speech_event_count += 1  # Repeating the same word is still a new event
+    telemetry.publish('speech', {'command': command, 'id': speech_event_count})
+
+telemetry.publish('speech', {'command': None, 'id': speech_event_count})
+
+class SpeechPipeline:
+    """Streams audio chunks through a Vosk recognizer.
+
+    Chunks are pushed from the PyAudio callback (or a WAV replay) into a
+    bounded ring buffer and consumed by the listening thread. A command is
+    acted on as soon as the partial result has shown it
+    VOSK_PARTIAL_STABLE_COUNT times in a row, so it does not have to wait
+    for Vosk to finalise the utterance. The final result only acts if it
+    asks for more than that, such as a sequence or an explicit duration.
+    Partial results carry no confidences, so if the final result rejects
+    what a partial started (low confidence or no command at all), on_cancel
+    is called to stop it.
+    """
+
+    def __init__(self, recognizer, on_command, on_cancel=None):
+        self.recognizer = recognizer
+        self.on_command = on_command
+        self.on_cancel = on_cancel
+        self.dropped_chunks = 0
+        self._chunks = deque(maxlen=VOSK_RING_CHUNKS)
+        self._cond = threading.Condition()
+        self._reset_utterance()
+
+    def _reset_utterance(self):
+        self._partial_command = None
+        self._partial_count = 0
+        self._acted = False
+
+    def push(self, data):
+        with self._cond:
+            if len(self._chunks) == self._chunks.maxlen:
+                self.dropped_chunks += 1
+            self._chunks.append(data)
+            self._cond.notify()
+
+    def audio_callback(self, in_data, frame_count, time_info, status):
+        self.push(in_data)
+        return (None, pyaudio.paContinue)
+
+    def pop(self, timeout):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._chunks, timeout):
+                return None
+            return self._chunks.popleft()
+
+    def process(self, data):
+        """Feed one chunk; returns the command acted on, if any."""
+        if self.recognizer.AcceptWaveform(data):
+            result_full = self.recognizer.Result()
+            result = json.loads(result_full)
+            text = result.get('text', '').lower()
+            already_acted = self._acted
+            self._reset_utterance()
+            log.debug("Vosk full result: %s", result_full)
+            if not text:
+                log.debug("Vosk recognized empty text or no speech detected.")
+                if already_acted and self.on_cancel:
+                    self.on_cancel(text)
+                return None
+            log.info("Vosk recognized text: '%s'", text)
+            if 'result' in result:
+                words = [entry['word'].lower() for entry in result['result']]
+                confidences = [entry.get('conf', 1.0) for entry in result['result']]
+            else:
+                words = text.split()
+                confidences = None
+            matches = voice_index.match(words, confidences)
+            if not matches:
+                log.info("Ignoring unrecognized command: '%s' (no mapping found)", text)
+                if already_acted and self.on_cancel:
+                    self.on_cancel(text)
+                return None
+            steps = plan_voice_sequence(words, matches)
+            if already_acted and steps == [(matches[0].command, COMMAND_DURATION)]:
+                return None  # Exactly what the partial result already started
+            self.on_command(steps, text)
+            return matches[0].command
+
+        if self._acted:
+            return None
+        partial = json.loads(self.recognizer.PartialResult()).get('partial', '').lower()
+        matches = voice_index.match(partial.split())
+        command = matches[0].command if matches else None
+        if command is None or command != self._partial_command:
+            self._partial_command = command
+            self._partial_count = 1 if command else 0
+            return None
+        self._partial_count += 1
+        if self._partial_count < VOSK_PARTIAL_STABLE_COUNT:
+            return None
+        self._acted = True
+        self.on_command([(command, COMMAND_DURATION)], partial)
+        return command
+
+def handle_voice_command(steps, text):
+    summary = " then ".join(command for command, _ in steps)
+    log.info("Executing voice command (recognized as %s, mapped to %s)", text, summary,
+             extra={'fields': {'action': summary, 'durations': [duration for _, duration in steps]}})
+    execute_voice_sequence(steps)
+    while not speech_history_queue.empty():
+        speech_history_queue.get_nowait()
+    speech_history_queue.put(summary)
+    publish_speech_command(summary)
+
+def cancel_voice_command(text):
+    """Stop a command a partial result started once the final result rejects it."""
+    if current_control_mode != 'speech_recognition':
+        return
+    log.info("Final result '%s' rejected the command the partial result started; stopping", text,
+             extra={'fields': {'action': 'cancel'}})
+    command_scheduler.cancel('drive')
+    stop_motors()
+
 def vosk_listen_thread():
-    global vosk_recognizer, speech_active, audio_stream, speech_history_queue
-    print("Vosk listening thread started.")
+    log.info("Vosk listening thread started.")
     while True:
-        if speech_active and vosk_recognizer and audio_stream and audio_stream.is_active():
+        pipeline = speech_pipeline
+        if speech_active and pipeline:
             try:
-                data = audio_stream.read(4000, exception_on_overflow=False)
-                if vosk_recognizer.AcceptWaveform(data):
-                    result_full = vosk_recognizer.Result()
-                    result = json.loads(result_full)
-                    text = result.get('text', '').lower()
-                    print(f"Vosk full result: {result_full}")
-                    print(f"Vosk recognized text: '{text}'")
-
-                    actual_command = None
-                    if text in ["front", "far"]:
-                        actual_command = "front"
-                    elif text in ["back", "sack"]:
-                        actual_command = "back"
-                    elif text in ["left", "net", "laugh", "less"]:
-                        actual_command = "left"
-                    elif text in ["right", "write"]:
-                        actual_command = "right"
-                    elif text == "stop":
-                        actual_command = "stop"
-
-                    if actual_command:
-                        print(f"Executing voice command (recognized as {text}, mapped to {actual_command})")
-                        execute_timed_command(actual_command)
-                        while not speech_history_queue.empty():
-                            speech_history_queue.get_nowait()
-                        speech_history_queue.put(actual_command)
-                    else:
-                        print(f"Ignoring unrecognized command: '{text}' (no mapping found)")
-                else:
-                    print("Vosk recognized empty text or no speech detected.")
-
+                data = pipeline.pop(timeout=0.1)
+                if data is not None:
+                    pipeline.process(data)
             except Exception as e:
-                print(f"CRITICAL ERROR in Vosk listening thread: {e}")
+                log.critical("CRITICAL ERROR in Vosk listening thread: %s", e)
                 deinit_vosk()
                 init_vosk()
                 time.sleep(1)
@@ -428,6 +2031,226 @@ def vosk_listen_thread():
 vosk_thread = threading.Thread(target=vosk_listen_thread, daemon=True)
 vosk_thread.start()
 
+# --- MJPEG Broadcaster ---
+# Each /video_feed client streams at one rung of this ladder, lowest first.
+# AdaptiveBitrate moves it down when frames reach the client late and back up
+# once the link has kept up for a while. The top rung is the original stream.
+VideoProfile = namedtuple('VideoProfile', ['name', 'width', 'height', 'quality', 'fps'])
+VIDEO_PROFILES = [
+    VideoProfile('240p-low', 320, 240, 40, 10),
+    VideoProfile('240p', 320, 240, 55, 15),
+    VideoProfile('360p', 480, 360, 60, 20),
+    VideoProfile('480p', 640, 480, 70, 30),
+]
+VIDEO_LATENCY_TARGET_MS = 300   # Capture to fully written to the client's socket
+VIDEO_STEP_DOWN_FRAMES = 3      # Consecutive late frames before dropping a rung
+VIDEO_STEP_UP_SECONDS = 3.0     # Time well under target before trying the next rung up
+VIDEO_STEP_UP_HEADROOM = 1.5    # Measured delivery rate needed over the next rung's bitrate
+VIDEO_DELIVERY_MAX_AGE = 1.0    # Seconds a delivery-rate estimate counts after the last blocking write
+VIDEO_STATS_INTERVAL = 1.0      # Seconds between 'video' telemetry updates
+
+class AdaptiveBitrate:
+    """Picks a client's VIDEO_PROFILES rung from how fast its frames get out.
+
+    `update()` is called after every frame with the frame's age when the
+    write finished, its size and how long the write blocked. Writes that
+    block long enough to time are used to estimate the link's delivery rate.
+    Once writes stop blocking for VIDEO_DELIVERY_MAX_AGE the estimate is
+    dropped, since a link that takes every write at once is not starved.
+    Returns True when the rung changed. The clock is injectable so the
+    stepping can be checked without a real network.
+    """
+
+    def __init__(self, level=len(VIDEO_PROFILES) - 1, clock=time.monotonic):
+        self.level = level
+        self.clock = clock
+        self.latency_ms = None
+        self.delivery_kbps = None
+        self._delivery_at = None
+        self._late_frames = 0
+        self._good_since = None
+
+    @staticmethod
+    def _ewma(previous, sample, alpha=0.3):
+        return sample if previous is None else previous + alpha * (sample - previous)
+
+    def _next_rung_kbps(self, part_bytes):
+        current, upper = VIDEO_PROFILES[self.level], VIDEO_PROFILES[self.level + 1]
+        scale = (upper.width * upper.height) / (current.width * current.height)
+        return part_bytes * 8 / 1000 * scale * upper.fps
+
+    def update(self, latency_ms, part_bytes, send_seconds):
+        self.latency_ms = self._ewma(self.latency_ms, latency_ms)
+        now = self.clock()
+        if send_seconds > 0.002:
+            self.delivery_kbps = self._ewma(self.delivery_kbps, part_bytes * 8 / 1000 / send_seconds)
+            self._delivery_at = now
+        elif self._delivery_at is not None and now - self._delivery_at > VIDEO_DELIVERY_MAX_AGE:
+            self.delivery_kbps = self._delivery_at = None
+        # A link that cannot carry this rung at its frame rate only keeps latency
+        # down by dropping frames, so it counts as late too.
+        rung_kbps = part_bytes * 8 / 1000 * VIDEO_PROFILES[self.level].fps
+        starved = self.delivery_kbps is not None and self.delivery_kbps < rung_kbps
+        late = latency_ms > VIDEO_LATENCY_TARGET_MS or starved
+        self._late_frames = self._late_frames + 1 if late else 0
+        if self._late_frames >= VIDEO_STEP_DOWN_FRAMES and self.level > 0:
+            self.level -= 1
+            self._late_frames = 0
+            self._good_since = None
+            return True
+        if late or self.latency_ms >= VIDEO_LATENCY_TARGET_MS / 2 or self.level == len(VIDEO_PROFILES) - 1:
+            self._good_since = None
+            return False
+        if self._good_since is None:
+            self._good_since = now
+        elif now - self._good_since >= VIDEO_STEP_UP_SECONDS:
+            if self.delivery_kbps is None or \
+                    self.delivery_kbps >= VIDEO_STEP_UP_HEADROOM * self._next_rung_kbps(part_bytes):
+                self.level += 1
+                self._good_since = None
+                return True
+            self._good_since = now
+        return False
+
+class MjpegBroadcaster:
+    """Encodes each captured frame once per profile in use and fans the bytes out.
+
+    Clients on the same VIDEO_PROFILES rung share one encoded part, and
+    rungs nobody watches are not encoded. A client that falls behind picks
+    up the newest part when it is ready again, and the parts it never saw
+    are counted as dropped. Each client runs its own AdaptiveBitrate, and
+    its profile and measured latency are reported by client_stats() and
+    the 'video' telemetry topic.
+    """
+
+    def __init__(self, ring):
+        self._ring = ring
+        self._cond = threading.Condition()
+        self._parts = {}  # rung -> (capture timestamp, encoded part) for the newest frame
+        self._part_count = 0
+        self._clients = {}
+        self._next_client_id = 1
+
+    def encode(self, frame, levels):
+        """Multipart parts of `frame` for every profile level in use; None if it does not decode."""
+        overlay = gesture_active
+        image = None
+        scaled = {}
+        parts = {}
+        for level in levels:
+            profile = VIDEO_PROFILES[level]
+            size = (profile.width, profile.height)
+            if frame.jpeg is not None and not overlay and size == (CAMERA_WIDTH, CAMERA_HEIGHT):
+                # The camera's own JPEG already fits this profile: send it untouched.
+                parts[level] = (frame.timestamp, b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame.jpeg.tobytes() + b'\r\n')
+                continue
+            if image is None:
+                image = draw_gesture_overlay(frame) if overlay else frame.image
+                if image is None:
+                    return None
+            if size not in scaled:
+                same_size = image.shape[1] == profile.width and image.shape[0] == profile.height
+                scaled[size] = image if same_size else cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            success, buffer = cv2.imencode('.jpg', scaled[size], [int(cv2.IMWRITE_JPEG_QUALITY), profile.quality])
+            if success:
+                parts[level] = (frame.timestamp, b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        return parts
+
+    def encode_loop(self):
+        last_seq = 0
+        last_published = 0.0
+        while True:
+            frame = self._ring.wait_newer(last_seq)
+            if frame is None:
+                continue
+            last_seq = frame.seq
+            with self._cond:
+                levels = {stats['level'] for stats in self._clients.values()}
+            if not levels:
+                continue
+            try:
+                parts = self.encode(frame, levels)
+            except Exception as e:
+                # One bad frame must not end the stream for every viewer.
+                log.exception("Encoding frame %d failed: %s", frame.seq, e)
+                parts = None
+            if parts is None:
+                continue   # Dropped like a lost frame; viewers keep the previous one
+            with self._cond:
+                self._parts = parts
+                self._part_count += 1
+                self._cond.notify_all()
+            if frame.timestamp - last_published >= VIDEO_STATS_INTERVAL:
+                last_published = frame.timestamp
+                telemetry.publish('video', {'clients': [
+                    {key: stats[key] for key in ('id', 'client', 'profile', 'latency_ms')}
+                    for stats in self.client_stats()]})
+
+    def stream(self, client_name='unknown'):
+        abr = AdaptiveBitrate()
+        with self._cond:
+            client_id = self._next_client_id
+            self._next_client_id += 1
+            stats = {
+                'id': client_id,
+                'client': client_name,
+                'connected_at': time.time(),
+                'frames_sent': 0,
+                'frames_dropped': 0,
+                'frames_skipped': 0,  # Left out to keep to the profile's frame rate
+                'bytes_out': 0,
+                'level': abr.level,
+                'profile': VIDEO_PROFILES[abr.level].name,
+                'latency_ms': None,
+                'delivery_kbps': None,
+            }
+            self._clients[client_id] = stats
+            last_count = self._part_count
+        last_sent = 0.0
+        try:
+            while True:
+                with self._cond:
+                    if not self._cond.wait_for(lambda: self._part_count > last_count, timeout=1.0):
+                        continue
+                    if stats['frames_sent']:
+                        stats['frames_dropped'] += self._part_count - last_count - 1
+                    last_count = self._part_count
+                    entry = self._parts.get(abr.level)
+                if entry is None:
+                    continue  # Just changed rung; the next frame is encoded for it
+                captured, part = entry
+                started = time.monotonic()
+                # Small tolerance so capture jitter does not halve the frame rate.
+                if started - last_sent < 0.9 / VIDEO_PROFILES[abr.level].fps:
+                    stats['frames_skipped'] += 1
+                    continue
+                last_sent = started
+                yield part
+                finished = time.monotonic()
+                changed = abr.update((finished - captured) * 1000, len(part), finished - started)
+                with self._cond:
+                    stats['frames_sent'] += 1
+                    stats['bytes_out'] += len(part)
+                    stats['latency_ms'] = round(abr.latency_ms, 1)
+                    if abr.delivery_kbps is not None:
+                        stats['delivery_kbps'] = round(abr.delivery_kbps)
+                    stats['level'] = abr.level
+                    stats['profile'] = VIDEO_PROFILES[abr.level].name
+                if changed:
+                    log.info("Video client %s switched to %s (latency %.0f ms)",
+                             client_name, stats['profile'], abr.latency_ms)
+        finally:
+            with self._cond:
+                self._clients.pop(client_id, None)
+
+    def client_stats(self):
+        with self._cond:
+            return [dict(stats) for stats in self._clients.values()]
+
+video_broadcaster = MjpegBroadcaster(frame_ring)
+broadcaster_thread = threading.Thread(target=video_broadcaster.encode_loop, daemon=True)
+broadcaster_thread.start()
+
 # --- Flask App Routes ---
 app = Flask(__name__)
 
@@ -580,20 +2403,84 @@ html = """
   </div>
 
   <script>
-    let speechHistoryInterval;
+    const READY_TEXT = "Ready for command: Say 'front', 'back', 'left', 'right', or 'stop'";
 
     document.addEventListener('DOMContentLoaded', (event) => {
         const controlModeSelect = document.getElementById('controlMode');
         const savedMode = localStorage.getItem('controlMode') || 'ipad_buttons';
         controlModeSelect.value = savedMode;
         changeControlMode(true);
-        setInterval(checkControllerStatus, 3000);
-        checkControllerStatus();
-        setInterval(updateObstacleWarning, 200);
+        connectTelemetry();
+        connectDrive();
     });
 
+    // One long-lived Server-Sent Events stream replaces the obstacle, speech
+    // and controller polls; the server only sends something when it changes.
+    function connectTelemetry() {
+        const source = new EventSource('/events');
+        source.addEventListener('obstacle', (e) => showObstacleWarning(JSON.parse(e.data)));
+        source.addEventListener('speech', (e) => showSpeechCommand(JSON.parse(e.data)));
+        source.addEventListener('controller', (e) => showControllerStatus(JSON.parse(e.data)));
+        source.addEventListener('mode', (e) => {
+            const data = JSON.parse(e.data);
+            const controlModeSelect = document.getElementById('controlMode');
+            if (controlModeSelect.value !== data.mode) {
+                controlModeSelect.value = data.mode;
+                changeControlMode(true);
+            }
+        });
+        source.onerror = () => {
+            const controllerStatusP = document.getElementById('controllerStatus');
+            controllerStatusP.textContent = 'Connection to car lost, reconnecting...';
+            controllerStatusP.style.color = 'red';
+        };
+    }
+
+    // Drive commands go over a WebSocket when the server offers one, with a
+    // sequence number so the car can ignore presses that arrive out of order.
+    let driveSocket = null;
+    let driveSeq = 0;
+    let driveRtt = null;
+    let driveFailures = 0;
+
+    function connectDrive() {
+        const scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+        const socket = new WebSocket(scheme + location.host + '/drive');
+        socket.onopen = () => {
+            driveSocket = socket;
+            driveFailures = 0;
+        };
+        socket.onmessage = (e) => {
+            const ack = JSON.parse(e.data);
+            if (ack.sent) {
+                driveRtt = Date.now() - ack.sent;
+            }
+        };
+        socket.onclose = () => {
+            driveSocket = null;
+            driveFailures += 1;
+            if (driveFailures < 5) {
+                setTimeout(connectDrive, 1000);
+            }
+        };
+    }
+
+    // Heartbeat for the server's dead-man timeout; also carries the last RTT.
+    setInterval(() => {
+        if (driveSocket && driveSocket.readyState === WebSocket.OPEN) {
+            driveSocket.send(JSON.stringify({rtt: driveRtt}));
+            driveRtt = null;
+        }
+    }, 150);
+
     function send(cmd) {
-      fetch('/' + cmd);
+      if (driveSocket && driveSocket.readyState === WebSocket.OPEN) {
+        driveSeq += 1;
+        driveSocket.send(JSON.stringify({seq: driveSeq, cmd: cmd, sent: Date.now(), rtt: driveRtt}));
+        driveRtt = null;
+      } else {
+        fetch('/' + cmd);
+      }
     }
 
     function changeControlMode(isInitialLoad = false) {
@@ -610,16 +2497,9 @@ html = """
 
         if (selectedMode === 'speech_recognition') {
             speechHistoryBox.style.display = 'block';
-            speechHistoryBox.textContent = "Ready for command: Say 'front', 'back', 'left', 'right', or 'stop'";
-            if (!speechHistoryInterval) {
-                speechHistoryInterval = setInterval(updateSpeechHistory, 500);
-            }
+            speechHistoryBox.textContent = READY_TEXT;
         } else {
             speechHistoryBox.style.display = 'none';
-            if (speechHistoryInterval) {
-                clearInterval(speechHistoryInterval);
-                speechHistoryInterval = null;
-            }
         }
 
         localStorage.setItem('controlMode', selectedMode);
@@ -627,109 +2507,72 @@ html = """
         if (!isInitialLoad) {
             fetch('/set_control_mode?mode=' + selectedMode)
                 .then(response => response.text())
-                .then(data => {
-                    console.log('Control mode set to:', selectedMode, 'Response:', data);
-                    if (selectedMode === 'switch_controller') {
-                        checkControllerStatus();
-                    }
-                })
+                .then(data => console.log('Control mode set to:', selectedMode, 'Response:', data))
                 .catch(error => console.error('Error setting control mode:', error));
         }
     }
 
-    function checkControllerStatus() {
+    function showControllerStatus(data) {
         const controllerStatusP = document.getElementById('controllerStatus');
-        fetch('/get_controller_status')
-            .then(response => response.json())
-            .then(data => {
-                if (data.status === 'connected') {
-                    controllerStatusP.textContent = `Controller Connected: ${data.name}`;
-                    controllerStatusP.style.color = 'green';
-                } else {
-                    controllerStatusP.textContent = 'Controller Not Connected or Not Found';
-                    controllerStatusP.style.color = 'red';
-                }
-            })
-            .catch(error => {
-                console.error('Error checking controller status:', error);
-                controllerStatusP.textContent = 'Error checking controller status.';
-                controllerStatusP.style.color = 'red';
-            });
+        if (data.status === 'connected') {
+            controllerStatusP.textContent = `Controller Connected: ${data.name}`;
+            controllerStatusP.style.color = 'green';
+        } else {
+            controllerStatusP.textContent = 'Controller Not Connected or Not Found';
+            controllerStatusP.style.color = 'red';
+        }
     }
 
     let speechDisplayTimeout;
-    function updateSpeechHistory() {
+    let lastSpeechId;
+    function showSpeechCommand(data) {
+        // The first event after (re)connecting is the last command heard, not a new one.
+        if (lastSpeechId === undefined) {
+            lastSpeechId = data.id;
+            return;
+        }
+        if (data.id === lastSpeechId || !data.command) {
+            return;
+        }
+        lastSpeechId = data.id;
         const speechHistoryBox = document.getElementById('speechHistoryBox');
-        fetch('/get_speech_history')
-            .then(response => response.json())
-            .then(data => {
-                if (data.command && data.command !== speechHistoryBox.dataset.lastCommand) {
-                    speechHistoryBox.textContent = data.command.charAt(0).toUpperCase() + data.command.slice(1);
-                    speechHistoryBox.dataset.lastCommand = data.command;
-                    if (speechDisplayTimeout) {
-                        clearTimeout(speechDisplayTimeout);
-                    }
-                    speechDisplayTimeout = setTimeout(() => {
-                        speechHistoryBox.textContent = "Ready for command: Say 'front', 'back', 'left', 'right', or 'stop'";
-                        speechHistoryBox.dataset.lastCommand = '';
-                    }, 2000);
-                }
-            })
-            .catch(error => {
-                console.error('Error fetching speech history:', error);
-                speechHistoryBox.textContent = 'Speech system error.';
-            });
+        speechHistoryBox.textContent = data.command.charAt(0).toUpperCase() + data.command.slice(1);
+        if (speechDisplayTimeout) {
+            clearTimeout(speechDisplayTimeout);
+        }
+        speechDisplayTimeout = setTimeout(() => {
+            speechHistoryBox.textContent = READY_TEXT;
+        }, 2000);
     }
 
-    function updateObstacleWarning() {
-        fetch('/get_obstacle_status')
-            .then(response => response.json())
-            .then(data => {
-                const obstacleWarningBox = document.getElementById('obstacleWarningBox');
-                const obstacleWarningText = document.getElementById('obstacleWarningText');
-                if (data.warning) {
-                    obstacleWarningText.textContent = "Warning: Too Close!";
-                    obstacleWarningBox.style.display = 'block';
-                } else {
-                    obstacleWarningBox.style.display = 'none';
-                }
-            })
-            .catch(error => console.error('Error fetching obstacle status:', error));
+    function showObstacleWarning(data) {
+        const obstacleWarningBox = document.getElementById('obstacleWarningBox');
+        const obstacleWarningText = document.getElementById('obstacleWarningText');
+        if (data.warning) {
+            obstacleWarningText.textContent = "Warning: Too Close!";
+            obstacleWarningBox.style.display = 'block';
+        } else if (data.blocked) {
+            obstacleWarningText.textContent = "Obstacle ahead: forward driving blocked";
+            obstacleWarningBox.style.display = 'block';
+        } else {
+            obstacleWarningBox.style.display = 'none';
+        }
     }
   </script>
 </body>
 </html>
 """
 
-def gen_frames():
-    with mp_hands.Hands(
-        model_complexity=0,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    ) as hands:
-        while True:
-            success, frame = camera.read()
-            if not success:
-                break
-            if gesture_active:
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = hands.process(rgb_frame)
-                if results.multi_hand_landmarks:
-                    for hand_landmarks in results.multi_hand_landmarks:
-                        mp_drawing.draw_landmarks(
-                            frame,
-                            hand_landmarks,
-                            mp_hands.HAND_CONNECTIONS,
-                            mp_drawing_styles.get_default_hand_landmarks_style(),
-                            mp_drawing_styles.get_default_hand_connections_style()
-                        )
-            _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+def gen_frames(client_name='unknown'):
+    yield from video_broadcaster.stream(client_name)
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(gen_frames(request.remote_addr), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/video_stats')
+def video_stats():
+    return jsonify({'clients': video_broadcaster.client_stats(), 'camera': dict(camera_stats)}), 200
 
 @app.route('/')
 def index():
@@ -765,6 +2608,91 @@ def stop_route():
         stop_motors()
     return '', 200
 
+# --- Drive Command Channel ---
+# The iPad buttons send sequence-numbered commands over one WebSocket. A
+# command that arrives after a newer one is discarded, every command is acked
+# so the page can measure round-trip time, and the car stops when the page
+# goes quiet for longer than the dead-man timeout.
+DRIVE_DEADMAN_TIMEOUT = 0.5
+
+BUTTON_COMMANDS = {
+    'forward': lambda: move_forward(MAX_PWM_SPEED),
+    'backward': lambda: move_backward(MAX_PWM_SPEED),
+    'left': lambda: turn_left(MAX_PWM_SPEED),
+    'right': lambda: turn_right(MAX_PWM_SPEED),
+    'stop': stop_motors,
+}
+drive_stats = {'commands': 0, 'stale_dropped': 0, 'deadman_stops': 0, 'bad_messages': 0}
+drive_rtt_ms = deque(maxlen=100)  # Reported back by the page from our acks
+
+def drive_channel(ws):
+    last_seq = -1
+    moving = False
+    try:
+        while True:
+            raw = ws.receive(timeout=DRIVE_DEADMAN_TIMEOUT)
+            if raw is None:
+                if moving:
+                    stop_motors()
+                    moving = False
+                    drive_stats['deadman_stops'] += 1
+                    log.warning("Drive channel went quiet, stopping motors")
+                continue
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                drive_stats['bad_messages'] += 1
+                log.warning("Ignoring malformed drive message: %.80r", raw)
+                continue
+            rtt = message.get('rtt')
+            if isinstance(rtt, (int, float)) and not isinstance(rtt, bool):
+                drive_rtt_ms.append(float(rtt))
+            command = message.get('cmd')
+            if command is None:
+                continue  # Heartbeat
+            seq = message.get('seq')
+            if not isinstance(seq, int) or isinstance(seq, bool):
+                drive_stats['bad_messages'] += 1
+                log.warning("Ignoring drive message without an integer seq: %.80r", raw)
+                continue
+            if seq <= last_seq:
+                drive_stats['stale_dropped'] += 1
+                ws.send(json.dumps({'ack': seq, 'stale': True}))
+                continue
+            last_seq = seq
+            applied = command in BUTTON_COMMANDS and current_control_mode == 'ipad_buttons'
+            if applied:
+                BUTTON_COMMANDS[command]()
+                drive_stats['commands'] += 1
+                moving = command != 'stop'
+            ws.send(json.dumps({'ack': seq, 'sent': message.get('sent'), 'applied': applied}))
+    except ConnectionClosed:
+        pass
+    finally:
+        if moving:
+            stop_motors()
+
+if Sock is not None:
+    sock = Sock(app)
+    sock.route('/drive')(drive_channel)
+else:
+    log.warning("flask-sock is not installed: no /drive WebSocket, the iPad buttons fall back "
+                "to one HTTP request per press without the dead-man stop (pip install flask-sock)")
+
+@app.route('/drive_stats')
+def get_drive_stats():
+    stats = dict(drive_stats)
+    stats['websocket'] = Sock is not None
+    stats.update(latency_summary(drive_rtt_ms))
+    return jsonify(stats), 200
+
+@app.route('/events')
+def events():
+    return Response(telemetry.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/get_controller_status')
 def get_controller_status():
     if nintendo_controller:
@@ -772,6 +2700,12 @@ def get_controller_status():
     else:
         return jsonify({'status': 'disconnected', 'name': 'N/A'}), 200
 
+@app.route('/controller_stats')
+def get_controller_stats():
+    stats = dict(controller_stats)
+    stats['reconnect'] = latency_summary(controller_reconnect_ms)
+    return jsonify(stats), 200
+
 @app.route('/get_speech_history')
 def get_speech_history():
     if not speech_history_queue.empty():
@@ -781,13 +2715,45 @@ def get_speech_history():
 
 @app.route('/get_obstacle_status')
 def get_obstacle_status():
-    return jsonify({'warning': obstacle_warning}), 200
+    status = {'warning': obstacle_warning, 'blocked': motor_output.forward_blocked}
+    reading = obstacle_monitor.latest
+    if reading is not None:
+        status['distance_cm'] = round(reading.distance_cm, 1)
+        status['closing_speed_cm_s'] = round(reading.closing_speed_cm_s, 1)
+    return jsonify(status), 200
+
+@app.route('/gesture_stats')
+def get_gesture_stats():
+    stats = dict(gesture_stats)
+    stats['mode'] = GESTURE_RUNNING_MODE
+    stats['roi_tracking'] = hand_tracker.enabled
+    stats['voting'] = gesture_voter.enabled
+    stats.update(latency_summary(gesture_latency_ms))
+    stats.update(latency_summary(gesture_inference_ms, 'inference'))
+    return jsonify(stats), 200
+
+@app.route('/safety_stats')
+def get_safety_stats():
+    stats = dict(brake_stats)
+    stats['forward_blocked'] = motor_output.forward_blocked
+    stats['blocked_commands'] = motor_output.blocked_count
+    stats.update(latency_summary(brake_latency_ms))
+    return jsonify(stats), 200
 
 @app.route('/set_control_mode')
 def set_control_mode():
     global current_control_mode, controller_active, speech_active, gesture_active, obstacle_detection_active
     mode = request.args.get('mode')
     if mode in ['ipad_buttons', 'switch_controller', 'speech_recognition', 'gesture_recognition']:
+        if mode == 'speech_recognition':
+            # Open the microphone first, so a failure leaves the current mode untouched.
+            try:
+                deinit_vosk()
+                init_vosk()
+            except Exception as e:
+                log.error("Cannot start speech recognition: %s", e)
+                deinit_vosk()
+                return f"Speech recognition unavailable: {e}", 503
         current_control_mode = mode
         stop_motors()
         if mode == 'switch_controller':
@@ -795,60 +2761,84 @@ def set_control_mode():
             speech_active = False
             gesture_active = False
             obstacle_detection_active = True
-            print("Control mode set to Switch Controller.")
+            log.info("Control mode set to Switch Controller.")
         elif mode == 'speech_recognition':
             controller_active = False
             speech_active = True
             gesture_active = False
             obstacle_detection_active = False
-            deinit_vosk()
-            init_vosk()
-            print("Control mode set to Speech Recognition.")
+            log.info("Control mode set to Speech Recognition.")
         elif mode == 'gesture_recognition':
             controller_active = False
             speech_active = False
             gesture_active = True
             obstacle_detection_active = False
-            print("Control mode set to Gesture Recognition.")
+            log.info("Control mode set to Gesture Recognition.")
         else:  # ipad_buttons
             controller_active = False
             speech_active = False
             gesture_active = False
             obstacle_detection_active = True
             deinit_vosk()
-            print("Control mode set to iPad Buttons.")
+            log.info("Control mode set to iPad Buttons.")
+        command_scheduler.cancel('drive')  # Drop any voice command still running
         buzzer.off()  # Ensure buzzer is off when switching modes
+        telemetry.publish('mode', {'mode': mode})
+        notify_gesture_event()
         return f"Control mode set to {mode}", 200
     return "Invalid mode", 400
 
+def get_vosk_model():
+    global vosk_model
+    with vosk_model_lock:
+        if vosk_model is None:
+            if VOSK_USE_STUB:
+                vosk_model = pi5car_sim.StubVoskModel()
+                log.info("No Vosk model at %s; using the stub recognizer.", VOSK_MODEL_PATH)
+            else:
+                SetLogLevel(-1)
+                vosk_model = Model(VOSK_MODEL_PATH)
+                log.info("Vosk model loaded.")
+        return vosk_model
+
+def build_vosk_recognizer(model):
+    recognizer_class = pi5car_sim.StubKaldiRecognizer if VOSK_USE_STUB else KaldiRecognizer
+    if VOSK_USE_GRAMMAR:
+        recognizer = recognizer_class(model, VOSK_SAMPLE_RATE, json.dumps(voice_index.grammar()))
+    else:
+        recognizer = recognizer_class(model, VOSK_SAMPLE_RATE)
+    recognizer.SetWords(True)  # Per-word confidences for VoiceCommandIndex
+    return recognizer
+
+# Switching in and out of speech mode only opens and closes the microphone
+# stream; the model and the PyAudio instance stay resident.
 def init_vosk():
-    global vosk_model, vosk_recognizer, p_audio, audio_stream
-    if not vosk_model:
-        SetLogLevel(-1)
-        vosk_model = Model(VOSK_MODEL_PATH)
-        vosk_recognizer = KaldiRecognizer(vosk_model, 16000)
-        p_audio = pyaudio.PyAudio()
-        audio_stream = p_audio.open(format=pyaudio.paInt16, channels=1, rate=16000,
+    global vosk_recognizer, speech_pipeline, p_audio, audio_stream
+    if not audio_stream:
+        vosk_recognizer = build_vosk_recognizer(get_vosk_model())
+        speech_pipeline = SpeechPipeline(vosk_recognizer, handle_voice_command, cancel_voice_command)
+        if not p_audio:
+            p_audio = pi5car_sim.WavAudio(SIM_AUDIO_WAVS) if SIMULATED else pyaudio.PyAudio()
+        audio_stream = p_audio.open(format=pyaudio.paInt16, channels=1, rate=VOSK_SAMPLE_RATE,
                                     input=True, input_device_index=VOSK_MIC_INDEX,
-                                    frames_per_buffer=8000)
+                                    frames_per_buffer=VOSK_CHUNK_FRAMES,
+                                    stream_callback=speech_pipeline.audio_callback)
         audio_stream.start_stream()
-        print("Vosk initialized.")
+        log.info("Vosk initialized.")
 
 def deinit_vosk():
-    global vosk_model, vosk_recognizer, p_audio, audio_stream
+    global vosk_recognizer, speech_pipeline, audio_stream
     if audio_stream:
         audio_stream.stop_stream()
         audio_stream.close()
         audio_stream = None
-    if p_audio:
-        p_audio.terminate()
-        p_audio = None
     vosk_recognizer = None
-    vosk_model = None
-    print("Vosk de-initialized.")
+    speech_pipeline = None
+    log.info("Vosk de-initialized.")
 
 if __name__ == '__main__':
+    log.info("Hardware backend: %s, camera: %s", HARDWARE_BACKEND, CAMERA_SOURCE)
     stop_motors()
-    init_vosk()
+    get_vosk_model()
     app.run(host='0.0.0.0', port=5000, threaded=True)
 
@@ -0,0 +1,815 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import wave
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import Pi5car
+import pi5car_sim
+
+# --- Helpers ---
+class SlowSink(io.TextIOBase):
+    """Stand-in for a slow journal or SSH pipe: every write stalls for `delay` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return len(text)
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {}
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': round(ordered[-1], 3),
+    }
+
+# --- Motor Call Logging Benchmark ---
+# Both paths write the motor pins through MotorOutput and report the action
+# once, so the only difference is print() to stdout versus log_action()
+# through the queued log handler.
+def old_print_forward(speed):
+    if Pi5car.motor_output.apply(Pi5car.DriveCommand(1, 0, 0, 1, speed, speed, 1, 0)):
+        print(f"Action: Forward at {speed:.2f}")
+
+def old_print_stop():
+    if Pi5car.motor_output.apply(Pi5car.DriveCommand(0, 0, 0, 0, 0.0, 0.0, 0, 0)):
+        print("Action: Stop")
+
+def log_forward(speed):
+    if Pi5car.motor_output.apply(Pi5car.channel_command(speed, speed)):
+        Pi5car.log_action("forward", speed, speed)
+
+def log_stop():
+    if Pi5car.motor_output.apply(Pi5car.STOP_COMMAND):
+        Pi5car.log_action("stop", 0.0, 0.0)
+
+def time_calls(forward, stop, iterations):
+    samples = []
+    for _ in range(iterations):
+        for call in (lambda: forward(Pi5car.BASE_SPEED), stop):
+            start = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+def bench_motor_log(args):
+    real_stdout = sys.stdout
+    real_stream = Pi5car._log_stream_handler.stream
+    sink = SlowSink(args.sink_delay_ms / 1000) if args.sink_delay_ms else real_stdout
+    Pi5car.current_control_mode = 'ipad_buttons'
+    try:
+        sys.stdout = sink
+        Pi5car._log_stream_handler.setStream(sink)
+        results = {
+            'sink_delay_ms': args.sink_delay_ms,
+            'print_path_ms': time_calls(old_print_forward, old_print_stop, args.iterations),
+            'logging_path_ms': time_calls(log_forward, log_stop, args.iterations),
+            'log_records_dropped': Pi5car.log_handler.dropped,
+        }
+    finally:
+        sys.stdout = real_stdout
+        Pi5car._log_stream_handler.setStream(real_stream)
+        Pi5car.stop_motors()
+    return results
+
+# --- Vosk WAV Replay ---
+SPEECH_RMS_THRESHOLD = 500   # 16-bit RMS above which a chunk counts as speech
+TRAILING_SILENCE = 1.0       # Seconds of silence fed after each file so Vosk can finalise
+
+def speech_end_offset(samples, chunk_frames, rate):
+    """Seconds from the start of the file to the end of the last loud chunk."""
+    end = 0
+    for start in range(0, len(samples), chunk_frames):
+        chunk = samples[start:start + chunk_frames].astype(np.float64)
+        if chunk.size and np.sqrt(np.mean(chunk ** 2)) > SPEECH_RMS_THRESHOLD:
+            end = min(start + chunk_frames, len(samples))
+    return end / rate
+
+def replay_wav(model, path, chunk_frames):
+    with wave.open(path, 'rb') as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2 or wav.getframerate() != Pi5car.VOSK_SAMPLE_RATE:
+            raise ValueError(f"{path}: expected 16-bit mono at {Pi5car.VOSK_SAMPLE_RATE} Hz")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    samples = np.concatenate([samples, np.zeros(int(TRAILING_SILENCE * Pi5car.VOSK_SAMPLE_RATE), dtype=np.int16)])
+
+    if Pi5car.VOSK_USE_STUB:
+        # The stub recognizer hears the file's transcript rather than its audio.
+        while not pi5car_sim.spoken.empty():
+            pi5car_sim.spoken.get_nowait()
+        pi5car_sim.spoken.put(pi5car_sim.transcript_for(path))
+
+    commands = []
+    recognizer = Pi5car.build_vosk_recognizer(model)
+    pipeline = Pi5car.SpeechPipeline(recognizer, lambda steps, text: commands.append((time.monotonic(), steps[0][0], text)))
+    feeding_done = threading.Event()
+
+    def consume():
+        while True:
+            data = pipeline.pop(timeout=0.05)
+            if data is not None:
+                pipeline.process(data)
+            elif feeding_done.is_set():
+                break
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    chunk_seconds = chunk_frames / Pi5car.VOSK_SAMPLE_RATE
+    started = time.monotonic()
+    # Like a microphone, chunk i only becomes available once it has been "recorded".
+    for index, start in enumerate(range(0, len(samples), chunk_frames)):
+        time.sleep(max(0.0, started + (index + 1) * chunk_seconds - time.monotonic()))
+        pipeline.push(samples[start:start + chunk_frames].tobytes())
+    feeding_done.set()
+    consumer.join()
+
+    utterance_end = started + speech_end_offset(samples, chunk_frames, Pi5car.VOSK_SAMPLE_RATE)
+    result = {'file': path, 'command': None, 'text': None, 'latency_ms': None,
+              'dropped_chunks': pipeline.dropped_chunks}
+    if commands:
+        when, command, text = commands[0]
+        result.update(command=command, text=text, latency_ms=round((when - utterance_end) * 1000, 1))
+    return result
+
+def bench_vosk_replay(args):
+    if args.final_only:
+        Pi5car.VOSK_PARTIAL_STABLE_COUNT = float('inf')
+    Pi5car.VOSK_USE_GRAMMAR = not args.open_vocabulary
+    model = Pi5car.get_vosk_model()
+    files = [replay_wav(model, path, args.chunk_frames) for path in args.wavs]
+    latencies = [entry['latency_ms'] for entry in files if entry['latency_ms'] is not None]
+    return {
+        'recognizer': 'stub' if Pi5car.VOSK_USE_STUB else Pi5car.VOSK_MODEL_PATH,
+        'chunk_frames': args.chunk_frames,
+        'early_partial': not args.final_only,
+        'grammar': Pi5car.VOSK_USE_GRAMMAR,
+        'files': files,
+        'utterance_end_to_command_ms': percentiles(latencies),
+    }
+
+# --- Mode Switch Benchmark ---
+def bench_mode_switch(args):
+    client = Pi5car.app.test_client()
+    to_speech = []
+    to_buttons = []
+    try:
+        for _ in range(args.iterations):
+            if args.reload_model:
+                Pi5car.vosk_model = None
+            start = time.perf_counter()
+            client.get('/set_control_mode?mode=speech_recognition')
+            to_speech.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            client.get('/set_control_mode?mode=ipad_buttons')
+            to_buttons.append((time.perf_counter() - start) * 1000)
+    finally:
+        Pi5car.deinit_vosk()
+    return {
+        'reload_model': args.reload_model,
+        'to_speech_ms': percentiles(to_speech),
+        'to_ipad_buttons_ms': percentiles(to_buttons),
+    }
+
+# --- Controller Event Replay ---
+def record_controller(args):
+    import evdev
+    device = evdev.InputDevice(args.device)
+    started = time.monotonic()
+    count = 0
+    with open(args.output, 'w') as out:
+        for event in device.read_loop():
+            out.write(json.dumps([round(event.timestamp(), 6), event.type, event.code, event.value]) + "\n")
+            count += 1
+            if time.monotonic() - started > args.seconds:
+                break
+    return {'device': device.name, 'events': count, 'output': args.output}
+
+ReplayEvent = namedtuple('ReplayEvent', ['type', 'code', 'value'])
+
+def load_event_log(path):
+    events = []
+    with open(path) as log_file:
+        for line in log_file:
+            if line.strip():
+                timestamp, event_type, code, value = json.loads(line)
+                events.append((timestamp, ReplayEvent(event_type, code, value)))
+    return events
+
+def bench_controller_replay(args):
+    """Replay a recorded event log through the frame decoder and the fixed-rate control loop."""
+    events = load_event_log(args.log)
+    abs_ranges = {Pi5car.ecodes.ABS_X: (args.abs_min, args.abs_max), Pi5car.ecodes.ABS_Y: (args.abs_min, args.abs_max)}
+    decoder = Pi5car.ControllerFrameDecoder(abs_ranges)
+    # A private drive stepped in event time, so the replay does not race the live drive thread.
+    drive = Pi5car.DifferentialDrive(Pi5car.motor_output)
+    writes_before = Pi5car.motor_output.write_count
+    per_event_updates = 0
+    setpoint_changes = 0
+    period = 1 / Pi5car.CONTROLLER_CONTROL_HZ
+    next_tick = events[0][0] if events else 0.0
+    decode_ms = []
+    try:
+        for timestamp, event in events:
+            # Apply the latest frame at every control tick that passed before this event.
+            while timestamp >= next_tick:
+                setpoint_changes += drive.set_velocity(*Pi5car.controller_velocity(decoder.state))
+                drive.step()
+                next_tick += period
+            start = time.perf_counter()
+            decoder.feed(event)
+            decode_ms.append((time.perf_counter() - start) * 1000)
+            per_event_updates += event.type != Pi5car.ecodes.EV_SYN
+        setpoint_changes += drive.set_velocity(*Pi5car.controller_velocity(decoder.state))
+        while drive.step():
+            pass
+    finally:
+        drive.halt()
+    return {
+        'events': decoder.events,
+        'frames': decoder.frames,
+        'control_hz': Pi5car.CONTROLLER_CONTROL_HZ,
+        'old_motor_updates': per_event_updates,
+        'setpoint_changes': setpoint_changes,
+        'motor_writes': Pi5car.motor_output.write_count - writes_before,
+        'decode_ms': percentiles(decode_ms),
+    }
+
+# --- Drive Ramp Trace ---
+DRIVE_TRACE_STEPS = {
+    'forward': lambda: Pi5car.move_forward(Pi5car.MAX_PWM_SPEED),
+    'backward': lambda: Pi5car.move_backward(Pi5car.MAX_PWM_SPEED),
+    'left': lambda: Pi5car.turn_left(Pi5car.TURN_SPEED),
+    'right': lambda: Pi5car.turn_right(Pi5car.TURN_SPEED),
+    'stop': Pi5car.stop_motors,
+}
+
+def bench_drive_trace(args):
+    """Step a drive by hand and sample the pins after every control tick.
+
+    Run it on the simulated backend (PI5CAR_BACKEND=sim, whose mock pins
+    support PWM) to check the ENA/ENB waveforms and direction pins without
+    a car.
+    """
+    steps = []
+    for item in args.sequence:
+        name, _, seconds = item.partition(':')
+        steps.append((name, float(seconds or 1.0)))
+    # The motor functions go through Pi5car.drive; swap in a private drive that only
+    # this loop steps, so the live drive thread cannot add ticks to the trace.
+    live_drive = Pi5car.drive
+    drive = Pi5car.drive = Pi5car.DifferentialDrive(Pi5car.motor_output)
+    ticks_per_second = round(1 / drive.period)
+    trace = []
+    Pi5car.current_control_mode = 'ipad_buttons'
+    try:
+        for name, seconds in steps:
+            DRIVE_TRACE_STEPS[name]()
+            for _ in range(int(seconds * ticks_per_second)):
+                drive.step()
+                trace.append({
+                    'step': name,
+                    'ena': round(Pi5car.ena.value, 2), 'enb': round(Pi5car.enb.value, 2),
+                    'in': [int(pin.value) for pin in (Pi5car.in1, Pi5car.in2, Pi5car.in3, Pi5car.in4)],
+                })
+    finally:
+        drive.halt()
+        Pi5car.drive = live_drive
+    return {'control_hz': ticks_per_second, 'accel_limit': drive.accel_limit,
+            'decel_limit': drive.decel_limit, 'trace': trace}
+
+# --- Recorded Gesture Clips ---
+def load_clip(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video file {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    frames = []
+    while True:
+        success, image = capture.read()
+        if not success:
+            break
+        frames.append(image)
+    capture.release()
+    return frames, fps
+
+def run_clip(frames, tracking, gating=False, fps=30, voter=None):
+    """Recognize every frame of a clip in IMAGE mode; returns per-frame (gesture, inference ms, tracked).
+
+    With `gating`, frames the motion gate passes over repeat the previous
+    frame's result at zero inference cost and are marked 'skipped'. With a
+    GestureVoter, inferred frames vote as they do in Pi5car.py, the gate is
+    bypassed while the voter is unsettled, and 'committed' is its command.
+    """
+    recognizer = Pi5car.create_gesture_recognizer()
+    tracker = Pi5car.HandTracker(enabled=tracking)
+    frame_time = [0.0]
+    gate = Pi5car.MotionGate(enabled=gating, clock=lambda: frame_time[0])
+    per_frame = []
+    for index, image in enumerate(frames):
+        frame_time[0] = index / fps
+        thumbnail = Pi5car.frame_thumbnail(Pi5car.Frame(index, frame_time[0], image))
+        force = voter is not None and not voter.settled
+        if per_frame and not gate.should_infer(thumbnail, force=force):
+            per_frame.append(dict(per_frame[-1], inference_ms=0.0, skipped=True))
+            continue
+        crop, region = tracker.crop(image)
+        mp_image = Pi5car.as_mp_image(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        start = time.perf_counter()
+        result = recognizer.recognize(mp_image)
+        inference_ms = (time.perf_counter() - start) * 1000
+        height, width = image.shape[:2]
+        tracker.update(Pi5car.HandTracker.to_frame(result.hand_landmarks, region, width, height), width, height)
+        gesture = result.gestures[0][0] if result.gestures else None
+        command, vote_score = Pi5car.gesture_vote(result)
+        committed = voter.vote(command, vote_score, frame_time[0]) if voter is not None else command
+        per_frame.append({
+            'gesture': gesture.category_name if gesture else 'None',
+            'score': float(gesture.score) if gesture else 0.0,
+            'command': command,
+            'vote_score': float(vote_score),
+            'committed': committed,
+            'inference_ms': inference_ms,
+            'tracked': region is not None,
+            'skipped': False,
+        })
+    recognizer.close()
+    return per_frame
+
+def bench_gesture_roi(args):
+    """Per-frame IMAGE-mode inference time on recorded clips, full frame vs hand-tracking crops."""
+    clips = []
+    for path in args.clips:
+        frames, _ = load_clip(path)
+        full = run_clip(frames, tracking=False)
+        tracked = run_clip(frames, tracking=True)
+        agree = sum(a['gesture'] == b['gesture'] for a, b in zip(full, tracked))
+        clips.append({
+            'clip': path,
+            'frames': len(frames),
+            'full_frame_inference_ms': percentiles([entry['inference_ms'] for entry in full]),
+            'tracking_inference_ms': percentiles([entry['inference_ms'] for entry in tracked]),
+            'tracked_fraction': round(sum(entry['tracked'] for entry in tracked) / max(1, len(tracked)), 3),
+            'gesture_agreement': round(agree / max(1, len(frames)), 3),
+        })
+    return {'recognizer': 'stub' if Pi5car.GESTURE_USE_STUB else Pi5car.GESTURE_MODEL_PATH,
+            'roi_input_size': Pi5car.GESTURE_ROI_INPUT_SIZE, 'clips': clips}
+
+def bench_gesture_gate(args):
+    """Inference work and decision lag on recorded clips, with and without the motion gate."""
+    clips = []
+    for path in args.clips:
+        frames, fps = load_clip(path)
+        every = run_clip(frames, tracking=Pi5car.GESTURE_ROI_TRACKING, fps=fps)
+        gated = run_clip(frames, tracking=Pi5car.GESTURE_ROI_TRACKING, gating=True, fps=fps)
+        # A gated frame that disagrees with the ungated run is a change the
+        # gate reacted to late (or missed until the forced refresh).
+        lagged = sum(a['gesture'] != b['gesture'] for a, b in zip(every, gated))
+        inferred = [entry['inference_ms'] for entry in gated if not entry['skipped']]
+        clips.append({
+            'clip': path,
+            'frames': len(frames),
+            'skipped_fraction': round(1 - len(inferred) / max(1, len(frames)), 3),
+            'inference_ms_total_ungated': round(sum(entry['inference_ms'] for entry in every), 1),
+            'inference_ms_total_gated': round(sum(inferred), 1),
+            'lagged_frames': lagged,
+            'gesture_agreement': round(1 - lagged / max(1, len(frames)), 3),
+        })
+    return {'recognizer': 'stub' if Pi5car.GESTURE_USE_STUB else Pi5car.GESTURE_MODEL_PATH,
+            'thumbnail': Pi5car.GESTURE_GATE_THUMBNAIL, 'clips': clips}
+
+def replay_votes(frames, fps, voting):
+    """Run a clip through the motion gate and a GestureVoter; returns [(frame index, committed command)]."""
+    per_frame = run_clip(frames, tracking=Pi5car.GESTURE_ROI_TRACKING, gating=Pi5car.GESTURE_GATE_ENABLED, fps=fps,
+                         voter=Pi5car.GestureVoter(enabled=voting))
+    commits = []
+    committed = 'none'
+    for index, entry in enumerate(per_frame):
+        if entry['committed'] != committed:
+            committed = entry['committed']
+            commits.append((index, committed))
+    return commits
+
+def score_commits(commits, labels, fps):
+    """False triggers and decision latency of `commits` against per-frame label commands."""
+    false_triggers = sum(command != 'none' and command != labels[index] for index, command in commits)
+    latency_ms = []
+    missed = 0
+    start = 0
+    while start < len(labels):
+        end = start
+        while end < len(labels) and labels[end] == labels[start]:
+            end += 1
+        if labels[start] != 'none':
+            # Already committed (early, by a misread) counts as decided on the first frame.
+            committed = next((command for index, command in reversed(commits) if index < start), 'none')
+            hits = [index for index, command in commits if start <= index < end and command == labels[start]]
+            if committed == labels[start]:
+                latency_ms.append(0.0)
+            elif hits:
+                latency_ms.append((hits[0] - start) * 1000 / fps)
+            else:
+                missed += 1
+        start = end
+    minutes = len(labels) / fps / 60
+    return {
+        'commits': len(commits),
+        'false_triggers': false_triggers,
+        'false_triggers_per_minute': round(false_triggers / minutes, 2) if minutes else None,
+        'missed_gestures': missed,
+        'decision_ms': percentiles(latency_ms),
+    }
+
+def bench_gesture_vote(args):
+    """False triggers and decision latency on labelled clips, single-frame vs voting."""
+    clips = []
+    for spec in args.clips:
+        path, _, script = spec.partition('=')
+        if not script:
+            raise SystemExit(f"{spec}: expected CLIP=LABELS, e.g. clip.mp4=None:2,Thumb_Up:1.5")
+        frames, fps = load_clip(path)
+        labels = []
+        for gesture, seconds in pi5car_sim.parse_gesture_script(script):
+            labels += [Pi5car.GESTURE_COMMANDS.get(gesture, 'none')] * round(seconds * fps)
+        labels = (labels + labels[-1:] * len(frames))[:len(frames)]
+        clips.append({
+            'clip': path,
+            'frames': len(frames),
+            'single_frame': score_commits(replay_votes(frames, fps, voting=False), labels, fps),
+            'voting': score_commits(replay_votes(frames, fps, voting=True), labels, fps),
+        })
+    return {'recognizer': 'stub' if Pi5car.GESTURE_USE_STUB else Pi5car.GESTURE_MODEL_PATH,
+            'vote_window_s': Pi5car.GESTURE_VOTE_WINDOW, 'vote_threshold': Pi5car.GESTURE_VOTE_THRESHOLD,
+            'vote_min_score': Pi5car.GESTURE_VOTE_MIN_SCORE, 'motion_gate': Pi5car.GESTURE_GATE_ENABLED,
+            'clips': clips}
+
+# --- End-to-End Suite (simulated backend) ---
+# Run as `PI5CAR_BACKEND=sim python bench_pi5car.py suite`. Every path is timed
+# from its input to the first GPIO write it causes, by polling the mock pins.
+POLL_INTERVAL = 0.0005
+AbsInfo = namedtuple('AbsInfo', ['value', 'min', 'max'])
+
+def wait_until(predicate, timeout=5.0):
+    """Poll `predicate`; returns the monotonic time it first held, or None on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return time.monotonic()
+        time.sleep(POLL_INTERVAL)
+    return None
+
+def motor_is(check):
+    def predicate():
+        command = Pi5car.motor_output.current()
+        return command is not None and check(command)
+    return predicate
+
+is_stopped = motor_is(lambda command: command.ena == 0 and command.enb == 0)
+is_moving = motor_is(lambda command: command.ena > 0 or command.enb > 0)
+
+def settle(predicate):
+    """Wait for `predicate`, then one drive period so the next command starts from an idle drive."""
+    wait_until(predicate)
+    time.sleep(Pi5car.drive.period)
+
+def ms_since(start, end):
+    return None if end is None else (end - start) * 1000
+
+def summarize(samples_ms):
+    timeouts = sum(sample is None for sample in samples_ms)
+    summary = percentiles([sample for sample in samples_ms if sample is not None])
+    summary['timeouts'] = timeouts
+    return summary
+
+def suite_buttons(client, samples):
+    client.get('/set_control_mode?mode=ipad_buttons')
+    latencies = {}
+    for route in ('/forward', '/backward', '/left', '/right'):
+        route_ms = []
+        for _ in range(samples):
+            settle(is_stopped)
+            writes = Pi5car.motor_output.write_count
+            start = time.monotonic()
+            client.get(route)
+            route_ms.append(ms_since(start, wait_until(lambda: Pi5car.motor_output.write_count != writes)))
+            client.get('/stop')
+        latencies[route] = summarize(route_ms)
+    stop_ms = []
+    for _ in range(samples):
+        client.get('/forward')
+        settle(motor_is(lambda command: command.ena == Pi5car.MAX_PWM_SPEED))
+        writes = Pi5car.motor_output.write_count
+        start = time.monotonic()
+        client.get('/stop')
+        stop_ms.append(ms_since(start, wait_until(lambda: Pi5car.motor_output.write_count != writes)))
+    latencies['/stop'] = summarize(stop_ms)
+    wait_until(is_stopped)
+    return latencies
+
+class BenchController:
+    """Looks like an evdev InputDevice to controller_session(); events come from the bench thread."""
+
+    name = 'Bench Controller'
+    path = '/dev/input/bench'
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.events = asyncio.Queue()
+
+    def capabilities(self):
+        return {Pi5car.ecodes.EV_ABS: [(Pi5car.ecodes.ABS_X, AbsInfo(0, -32767, 32767)),
+                                       (Pi5car.ecodes.ABS_Y, AbsInfo(0, -32767, 32767))]}
+
+    def active_keys(self):
+        return []
+
+    def absinfo(self, code):
+        return AbsInfo(0, -32767, 32767)
+
+    def send(self, *events):
+        for event_type, code, value in events:
+            self.loop.call_soon_threadsafe(self.events.put_nowait, ReplayEvent(event_type, code, value))
+
+    async def async_read_loop(self):
+        while True:
+            yield await self.events.get()
+
+def suite_controller(client, samples):
+    client.get('/set_control_mode?mode=switch_controller')
+    loop = asyncio.new_event_loop()
+    device = BenchController(loop)
+    session = loop.create_task(Pi5car.controller_session(device))
+
+    def run_session():
+        try:
+            loop.run_until_complete(session)
+        except asyncio.CancelledError:
+            pass  # Cancelled once the samples are taken
+
+    runner = threading.Thread(target=run_session, daemon=True)
+    runner.start()
+    ecodes = Pi5car.ecodes
+    press_ms = []
+    stick_ms = []
+    try:
+        for _ in range(samples):
+            settle(is_stopped)
+            start = time.monotonic()
+            device.send((ecodes.EV_KEY, Pi5car.BTN_ZR, 1), (ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+            press_ms.append(ms_since(start, wait_until(is_moving)))
+            device.send((ecodes.EV_KEY, Pi5car.BTN_ZR, 0), (ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+        for _ in range(samples):
+            settle(is_stopped)
+            start = time.monotonic()
+            device.send((ecodes.EV_ABS, ecodes.ABS_Y, -32767), (ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+            stick_ms.append(ms_since(start, wait_until(is_moving)))
+            device.send((ecodes.EV_ABS, ecodes.ABS_Y, 0), (ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+    finally:
+        loop.call_soon_threadsafe(session.cancel)
+        runner.join(timeout=1.0)
+        client.get('/set_control_mode?mode=ipad_buttons')
+        wait_until(is_stopped)
+    return {'zr_press_to_motor_ms': summarize(press_ms), 'stick_to_motor_ms': summarize(stick_ms)}
+
+def suite_voice(client, wavs):
+    if not wavs:
+        return {'skipped': "no --wav files given"}
+    client.get('/set_control_mode?mode=speech_recognition')
+    wait_until(lambda: Pi5car.audio_stream is not None, timeout=30.0)
+    stream = Pi5car.audio_stream
+    files = []
+    try:
+        for path in wavs:
+            with wave.open(path, 'rb') as wav:
+                samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            speech_end = speech_end_offset(samples, stream.frames_per_buffer, stream.rate)
+            wait_until(is_stopped, timeout=Pi5car.VOICE_MAX_DURATION + 1)
+            started_count = len(stream.utterances_started)
+            Pi5car.p_audio.play(path)
+            if wait_until(lambda: len(stream.utterances_started) > started_count) is None:
+                files.append({'file': path, 'latency_ms': None})
+                continue
+            utterance_end = stream.utterances_started[started_count] + speech_end
+            moved = wait_until(is_moving, timeout=speech_end + 3.0)
+            files.append({'file': path, 'latency_ms': ms_since(utterance_end, moved)})
+    finally:
+        client.get('/set_control_mode?mode=ipad_buttons')
+        wait_until(is_stopped)
+    return {'recognizer': 'stub' if Pi5car.VOSK_USE_STUB else Pi5car.VOSK_MODEL_PATH, 'files': files,
+            'utterance_end_to_motor_ms': summarize([entry['latency_ms'] for entry in files])}
+
+def suite_gesture(client, samples):
+    camera = Pi5car.camera
+    if not hasattr(camera, 'show'):
+        return {'skipped': "needs the synthetic camera (PI5CAR_CAMERA=synthetic)"}
+    stop_after_turn = Pi5car.STOP_DURATION_AFTER_TURN
+    Pi5car.STOP_DURATION_AFTER_TURN = 0.3  # Only shortens the wait between samples
+    is_forward = motor_is(lambda command: command.in1 and command.in4 and command.ena == Pi5car.BASE_SPEED)
+    decision_ms = []
+    motor_ms = []
+    try:
+        camera.show('None')
+        client.get('/set_control_mode?mode=gesture_recognition')
+        for index in range(samples):
+            gesture, command = ('Thumb_Up', 'turn_left') if index % 2 == 0 else ('Thumb_Down', 'turn_right')
+            settle(is_forward)
+            forward_writes = Pi5car.motor_output.write_count
+            requested = time.monotonic()
+            camera.show(gesture)
+            if wait_until(lambda: camera.changed_at is not None and camera.changed_at >= requested) is None:
+                continue
+            shown = camera.changed_at
+            decided = wait_until(lambda: Pi5car.current_gesture_command == command)
+            moved = wait_until(lambda: Pi5car.motor_output.write_count != forward_writes)
+            decision_ms.append(ms_since(shown, decided))
+            motor_ms.append(ms_since(shown, moved))
+            camera.show('None')
+    finally:
+        Pi5car.STOP_DURATION_AFTER_TURN = stop_after_turn
+        client.get('/set_control_mode?mode=ipad_buttons')
+        wait_until(is_stopped)
+    return {
+        'frame_to_decision_ms': summarize(decision_ms),
+        'frame_to_motor_ms': summarize(motor_ms),
+        'running_mode': Pi5car.GESTURE_RUNNING_MODE,
+        'frames_dropped': Pi5car.gesture_stats['frames_dropped'],
+        'frames_inferred': Pi5car.gesture_stats['frames_inferred'],
+        'frames_skipped': Pi5car.gesture_stats['frames_skipped'],
+    }
+
+def suite_mjpeg(viewer_counts, seconds):
+    results = {}
+    for viewers in viewer_counts:
+        counts = [0] * viewers
+        stop = threading.Event()
+
+        def watch(index):
+            stream = Pi5car.gen_frames(f'bench-{index}')
+            for _ in stream:
+                counts[index] += 1
+                if stop.is_set():
+                    break
+            stream.close()
+
+        threads = [threading.Thread(target=watch, args=(index,)) for index in range(viewers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1.0)  # Let every viewer receive its first frame
+        before = list(counts)
+        time.sleep(seconds)
+        fps = [(after - start) / seconds for after, start in zip(counts, before)]
+        stop.set()
+        for thread in threads:
+            thread.join()
+        results[str(viewers)] = {'fps_per_viewer': {'min': round(min(fps), 1), 'mean': round(sum(fps) / len(fps), 1)}}
+    return results
+
+def suite_throttled_viewer(link_kbps, seconds):
+    """One viewer whose link only carries `link_kbps`; reports where adaptive bitrate settles."""
+    stop = threading.Event()
+    latencies = []
+    frames = [0]
+
+    def watch():
+        stream = Pi5car.gen_frames('bench-throttled')
+        for part in stream:
+            time.sleep(len(part) * 8 / 1000 / link_kbps)  # The write blocks until the link has carried the part
+            frames[0] += 1
+            stats = [entry for entry in Pi5car.video_broadcaster.client_stats() if entry['client'] == 'bench-throttled']
+            if stats and stats[0]['latency_ms'] is not None:
+                latencies.append((time.monotonic(), stats[0]['latency_ms'], stats[0]['profile']))
+            if stop.is_set():
+                break
+        stream.close()
+
+    thread = threading.Thread(target=watch)
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    settled = [latency for when, latency, _ in latencies if when >= latencies[0][0] + seconds / 2] if latencies else []
+    return {
+        'link_kbps': link_kbps,
+        'fps': round(frames[0] / seconds, 1),
+        'final_profile': latencies[-1][2] if latencies else None,
+        'profiles_seen': sorted({profile for _, _, profile in latencies}),
+        'settled_latency_ms': percentiles(settled),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def bench_suite(args):
+    if not Pi5car.SIMULATED:
+        raise SystemExit("The suite drives the simulated hardware; run it with PI5CAR_BACKEND=sim")
+    client = Pi5car.app.test_client()
+    Pi5car.log.setLevel(logging.WARNING)  # Keep per-action logging out of the measurement
+    results = {
+        'revision': git_revision(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'samples': args.samples,
+        'button_to_gpio_ms': suite_buttons(client, args.samples),
+        'controller_event_to_motor': suite_controller(client, args.samples),
+        'voice_utterance_to_motor': suite_voice(client, args.wav),
+        'gesture_frame_to_motor': suite_gesture(client, args.samples),
+        'mjpeg_fps_by_viewers': suite_mjpeg(args.viewers, args.fps_seconds),
+        'mjpeg_throttled_viewer': [suite_throttled_viewer(kbps, args.throttle_seconds) for kbps in args.throttle_kbps],
+        'camera': dict(Pi5car.camera_stats),
+    }
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Pi5car latency benchmarks")
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    motor_log = subparsers.add_parser('motor-log', help="motor call cost with print() vs queued logging")
+    motor_log.add_argument('--iterations', type=int, default=500)
+    motor_log.add_argument('--sink-delay-ms', type=float, default=0.0,
+                           help="simulate a slow stdout consumer by stalling each write")
+    motor_log.set_defaults(func=bench_motor_log)
+
+    vosk_replay = subparsers.add_parser('vosk-replay', help="utterance-end to command latency from recorded WAV files")
+    vosk_replay.add_argument('wavs', nargs='+', help="16-bit mono WAV files at the Vosk sample rate")
+    vosk_replay.add_argument('--chunk-frames', type=int, default=Pi5car.VOSK_CHUNK_FRAMES)
+    vosk_replay.add_argument('--final-only', action='store_true',
+                             help="only act on final results, as the old listening loop did")
+    vosk_replay.add_argument('--open-vocabulary', action='store_true',
+                             help="decode without the command grammar")
+    vosk_replay.set_defaults(func=bench_vosk_replay)
+
+    mode_switch = subparsers.add_parser('mode-switch', help="time switching into and out of speech mode")
+    mode_switch.add_argument('--iterations', type=int, default=5)
+    mode_switch.add_argument('--reload-model', action='store_true',
+                             help="drop the cached model before every switch, as the old code did")
+    mode_switch.set_defaults(func=bench_mode_switch)
+
+    controller_record = subparsers.add_parser('controller-record', help="record raw evdev events to a JSON-lines log")
+    controller_record.add_argument('device', help="event device path, e.g. /dev/input/event5")
+    controller_record.add_argument('output')
+    controller_record.add_argument('--seconds', type=float, default=30.0)
+    controller_record.set_defaults(func=record_controller)
+
+    controller_replay = subparsers.add_parser('controller-replay', help="replay a recorded controller log through the decoder")
+    controller_replay.add_argument('log', help="JSON lines of [timestamp, type, code, value]")
+    controller_replay.add_argument('--abs-min', type=int, default=-32767)
+    controller_replay.add_argument('--abs-max', type=int, default=32767)
+    controller_replay.set_defaults(func=bench_controller_replay)
+
+    drive_trace = subparsers.add_parser('drive-trace', help="per-tick PWM and direction pins for a command sequence")
+    drive_trace.add_argument('sequence', nargs='+', help="steps like forward:1.5 left:0.9 stop:0.5")
+    drive_trace.set_defaults(func=bench_drive_trace)
+
+    gesture_roi = subparsers.add_parser('gesture-roi', help="gesture inference time per frame, full frame vs hand tracking")
+    gesture_roi.add_argument('clips', nargs='+', help="recorded gesture videos")
+    gesture_roi.set_defaults(func=bench_gesture_roi)
+
+    gesture_gate = subparsers.add_parser('gesture-gate', help="inference skipped by the motion gate and the lag it adds")
+    gesture_gate.add_argument('clips', nargs='+', help="recorded gesture videos")
+    gesture_gate.set_defaults(func=bench_gesture_gate)
+
+    gesture_vote = subparsers.add_parser('gesture-vote', help="false triggers and decision latency, single-frame vs voting")
+    gesture_vote.add_argument('clips', nargs='+',
+                              help="CLIP=LABELS, where LABELS lists what the clip shows, e.g. clip.mp4=None:2,Thumb_Up:1.5")
+    gesture_vote.set_defaults(func=bench_gesture_vote)
+
+    suite = subparsers.add_parser('suite', help="end-to-end latency and throughput on the simulated backend")
+    suite.add_argument('--samples', type=int, default=20)
+    suite.add_argument('--wav', nargs='*', default=[], help="utterances to speak through the simulated microphone")
+    suite.add_argument('--viewers', type=int, nargs='+', default=[1, 2, 4, 8])
+    suite.add_argument('--fps-seconds', type=float, default=3.0)
+    suite.add_argument('--throttle-kbps', type=float, nargs='*', default=[2000, 500],
+                       help="link rates for a single rate-limited viewer, to watch adaptive bitrate settle")
+    suite.add_argument('--throttle-seconds', type=float, default=15.0)
+    suite.add_argument('--output', help="also write the JSON results to this file")
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    print(json.dumps(args.func(args), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,449 @@
+"""Simulated hardware for running Pi5car.py without a Raspberry Pi.
+
+Pi5car.py imports this module when started with PI5CAR_BACKEND=sim. It
+provides stand-ins with the same interface as the real devices:
+
+- SyntheticCamera / VideoFileCamera replace cv2.VideoCapture(0)
+- WavAudio replaces pyaudio.PyAudio() and plays WAV files as the microphone
+- StubVoskModel / StubKaldiRecognizer replace Vosk when there is no model
+- StubGestureRecognizer replaces the MediaPipe GestureRecognizer
+- SonarTrigger answers HC-SR04 pings on a MockFactory echo pin
+
+`pyaudio`, `ecodes` and `list_devices` stand in for the constants and calls
+Pi5car.py uses from PyAudio and evdev, so the simulated backend also runs
+where those native packages are not installed.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import wave
+from collections import namedtuple
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+# --- Camera Sources ---
+# Synthetic frames show the gesture as a "hand" box whose blue channel encodes
+# which gesture it is; StubGestureRecognizer finds the box and reads it back.
+# That keeps the camera -> recognizer -> decision path honest without a real
+# hand, including for cropped (hand-tracking) inference.
+GESTURE_NAMES = ['None', 'Thumb_Up', 'Thumb_Down', 'Victory', 'Open_Palm', 'Closed_Fist', 'Pointing_Up']
+HAND_GREEN = 160
+HAND_RED = 220
+HAND_STEP = 32          # Blue channel step between gestures
+HAND_TOLERANCE = 24     # Colour error tolerated after JPEG compression
+
+def hand_colour(gesture):
+    """BGR fill colour of the hand box for `gesture`."""
+    return (GESTURE_NAMES.index(gesture) * HAND_STEP + HAND_STEP // 2, HAND_GREEN, HAND_RED)
+
+def parse_gesture_script(script):
+    """Parse "Thumb_Up:2,None:1" into [('Thumb_Up', 2.0), ('None', 1.0)]."""
+    steps = []
+    for item in filter(None, (part.strip() for part in script.split(','))):
+        name, _, seconds = item.partition(':')
+        if name not in GESTURE_NAMES:
+            raise ValueError(f"Unknown gesture {name!r} in script {script!r}")
+        steps.append((name, float(seconds or 1.0)))
+    return steps
+
+class SyntheticCamera:
+    """Generates frames at `fps` showing a scripted or manually set gesture.
+
+    The background is a fixed gradient. While a gesture other than 'None' is
+    shown, a skin-coloured "hand" box with a gesture-specific notch is drawn
+    in the middle of the frame.
+    With CAP_PROP_CONVERT_RGB off, frames are JPEG-encoded "in the camera".
+    """
+
+    def __init__(self, width=640, height=480, fps=30, script='', hand_size=(120, 160)):
+        self.width = width
+        self.height = height
+        self.period = 1 / fps
+        self.script = parse_gesture_script(script)
+        self.gesture = 'None'
+        self.hand_size = hand_size
+        self.hand_center = (width // 2, height // 2)   # Move it to exercise hand tracking
+        self.frames = 0
+        self.convert_rgb = True   # Off: frames come out as JPEG buffers, like a webcam's MJPEG stream
+        self.jpeg_quality = 80
+        self.changed_at = None   # monotonic time of the first frame showing the current gesture
+        self._rendered = None
+        self._started = time.monotonic()
+        self._next_frame = self._started
+        gradient = np.linspace(40, 160, width, dtype=np.uint8)
+        self._background = np.repeat(np.tile(gradient, (height, 1))[:, :, None], 3, axis=2)
+
+    def show(self, gesture):
+        """Show `gesture` from the next frame on; stops following the script."""
+        if gesture not in GESTURE_NAMES:
+            raise ValueError(f"Unknown gesture {gesture!r}")
+        self.script = []
+        self.gesture = gesture
+
+    def _scripted_gesture(self):
+        total = sum(seconds for _, seconds in self.script)
+        elapsed = (time.monotonic() - self._started) % total
+        for name, seconds in self.script:
+            if elapsed < seconds:
+                return name
+            elapsed -= seconds
+        return self.script[-1][0]
+
+    def render(self, gesture):
+        image = self._background.copy()
+        if gesture != 'None':
+            (x, y), (w, h) = self.hand_center, self.hand_size
+            cv2.rectangle(image, (x - w // 2, y - h // 2), (x + w // 2, y + h // 2), hand_colour(gesture), -1)
+            # A gesture-specific gap between "fingers", so gestures also
+            # differ in shape and brightness, not only in colour.
+            left = x - w // 2 + GESTURE_NAMES.index(gesture) * w // (len(GESTURE_NAMES) + 1)
+            cv2.rectangle(image, (left, y - h // 2), (left + w // 8, y - h // 6), (30, 30, 30), -1)
+        return image
+
+    def read(self):
+        now = time.monotonic()
+        if now < self._next_frame:
+            time.sleep(self._next_frame - now)
+        self._next_frame = max(self._next_frame + self.period, time.monotonic())
+        gesture = self._scripted_gesture() if self.script else self.gesture
+        if gesture != self._rendered:
+            self._rendered = gesture
+            self.changed_at = time.monotonic()
+        self.frames += 1
+        image = self.render(gesture)
+        if not self.convert_rgb:
+            success, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+            return success, buffer.reshape(1, -1)
+        return True, image
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_CONVERT_RGB:
+            self.convert_rgb = bool(value)
+            return True
+        return False
+
+    def get(self, prop):
+        return 0.0
+
+    def release(self):
+        pass
+
+class VideoFileCamera:
+    """Plays a video file in a loop at its own frame rate, like a live camera."""
+
+    def __init__(self, path):
+        self.path = path
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise ValueError(f"Cannot open video file {path}")
+        fps = self._capture.get(cv2.CAP_PROP_FPS) or 30
+        self.period = 1 / fps
+        self.frames = 0
+        self._next_frame = time.monotonic()
+
+    def read(self):
+        success, image = self._capture.read()
+        if not success:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, image = self._capture.read()
+        now = time.monotonic()
+        if now < self._next_frame:
+            time.sleep(self._next_frame - now)
+        self._next_frame = max(self._next_frame + self.period, time.monotonic())
+        self.frames += success
+        return success, image
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        return self._capture.get(prop)
+
+    def release(self):
+        self._capture.release()
+
+# --- Gesture Recognizer ---
+Category = namedtuple('Category', ['category_name', 'score'])
+Landmark = namedtuple('Landmark', ['x', 'y', 'z'])
+StubResult = namedtuple('StubResult', ['gestures', 'hand_landmarks'])
+
+class StubGestureRecognizer:
+    """Stands in for vision.GestureRecognizer in IMAGE and LIVE_STREAM mode.
+
+    Looks for a synthetic hand box in the (RGB) input, returns its gesture
+    and 21 landmarks spread over the box, normalised to the input image.
+    Inference takes `inference_ms` for a 640x480 input and scales with the
+    pixel count, so cropped inputs are cheaper as they would be for the
+    real model's per-pixel work. Async results are delivered from a worker
+    thread, so the live stream path sees the same callback timing it would
+    with MediaPipe.
+    """
+
+    def __init__(self, result_callback=None, inference_ms=20.0, min_inference_ms=4.0, score=0.9):
+        self.result_callback = result_callback
+        self.inference_ms = inference_ms
+        self.min_inference_ms = min_inference_ms
+        self.score = score
+        self.calls = 0
+        self._requests = queue.Queue()
+        if result_callback is not None:
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def classify(self, pixels):
+        red, green, blue = pixels[:, :, 0].astype(np.int16), pixels[:, :, 1].astype(np.int16), pixels[:, :, 2]
+        mask = (np.abs(red - HAND_RED) < HAND_TOLERANCE) & (np.abs(green - HAND_GREEN) < HAND_TOLERANCE)
+        if mask.sum() < 50:
+            return StubResult([], [])
+        index = int(round((float(np.median(blue[mask])) - HAND_STEP // 2) / HAND_STEP))
+        if index <= 0 or index >= len(GESTURE_NAMES):
+            return StubResult([], [])
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        height, width = mask.shape
+        landmarks = [Landmark(float(cols[0] + (cols[-1] - cols[0]) * (i % 5) / 4) / width,
+                              float(rows[0] + (rows[-1] - rows[0]) * (i // 5) / 4) / height, 0.0)
+                     for i in range(21)]
+        return StubResult([[Category(GESTURE_NAMES[index], self.score)]], [landmarks])
+
+    def _infer(self, image):
+        pixels = image.numpy_view() if hasattr(image, 'numpy_view') else image
+        scale = pixels.shape[0] * pixels.shape[1] / (640 * 480)
+        time.sleep(max(self.min_inference_ms, self.inference_ms * scale) / 1000)
+        return self.classify(pixels)
+
+    def recognize(self, image):
+        self.calls += 1
+        return self._infer(image)
+
+    def recognize_async(self, image, timestamp_ms):
+        self.calls += 1
+        self._requests.put((image, timestamp_ms))
+
+    def _worker(self):
+        while True:
+            image, timestamp_ms = self._requests.get()
+            self.result_callback(self._infer(image), image, timestamp_ms)
+
+    def close(self):
+        pass
+
+# --- Audio Source ---
+pyaudio = SimpleNamespace(paInt16=8, paContinue=0)
+
+def transcript_for(path):
+    """What a WAV file says: its `.txt` sidecar, else its name ("go_left.wav" -> "go left")."""
+    sidecar = os.path.splitext(path)[0] + '.txt'
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            return f.read().strip().lower()
+    return os.path.splitext(os.path.basename(path))[0].replace('_', ' ').replace('-', ' ').lower()
+
+# Transcripts of the utterances WavStreams have started playing, oldest first;
+# StubKaldiRecognizer takes one whenever it hears an utterance.
+spoken = queue.Queue()
+
+class WavAudio:
+    """Replaces pyaudio.PyAudio(): input streams play queued WAV files, then silence.
+
+    Chunks are handed to the stream callback in real time, as a microphone
+    would deliver them. `play()` queues another utterance on the open stream.
+    """
+
+    def __init__(self, paths=()):
+        self._pending = queue.Queue()
+        self.stream = None
+        for path in paths:
+            self.play(path)
+
+    def play(self, path):
+        with wave.open(path, 'rb') as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit mono audio")
+            self._pending.put((wav.getframerate(), wav.readframes(wav.getnframes()), transcript_for(path)))
+
+    def open(self, format=None, channels=1, rate=16000, input=True, input_device_index=None,
+             frames_per_buffer=1024, stream_callback=None):
+        self.stream = WavStream(self._pending, rate, frames_per_buffer, stream_callback)
+        return self.stream
+
+    def terminate(self):
+        if self.stream:
+            self.stream.close()
+
+class WavStream:
+    """The PyAudio stream returned by WavAudio.open()."""
+
+    def __init__(self, pending, rate, frames_per_buffer, callback):
+        self._pending = pending
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.chunks = 0
+        self.utterances_started = []   # monotonic time each queued WAV started playing
+        self._running = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def start_stream(self):
+        self._running.set()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop_stream(self):
+        self._running.clear()
+
+    def close(self):
+        self._closed = True
+        self._running.set()
+
+    def is_active(self):
+        return self._running.is_set() and not self._closed
+
+    def _run(self):
+        silence = bytes(2 * self.frames_per_buffer)
+        chunk_seconds = self.frames_per_buffer / self.rate
+        samples = b''
+        next_chunk = time.monotonic()
+        while not self._closed:
+            self._running.wait()
+            if self._closed:
+                break
+            if not samples:
+                try:
+                    rate, samples, transcript = self._pending.get_nowait()
+                    if rate != self.rate:
+                        raise ValueError(f"WAV sample rate {rate} does not match stream rate {self.rate}")
+                    self.utterances_started.append(time.monotonic())
+                    spoken.put(transcript)
+                except queue.Empty:
+                    samples = b''
+            chunk, samples = samples[:len(silence)], samples[len(silence):]
+            chunk = chunk.ljust(len(silence), b'\0')
+            next_chunk = max(next_chunk + chunk_seconds, time.monotonic())
+            time.sleep(max(0.0, next_chunk - time.monotonic()))
+            self.chunks += 1
+            self.callback(chunk, self.frames_per_buffer, None, 0)
+
+# --- Speech Recognition ---
+# Without a Vosk model the recognizer cannot really listen, so the stub only
+# finds utterances by their loudness and reports what the WAV file that is
+# playing says. Like Vosk it shows the words as a partial result once they
+# have been spoken, finalises the utterance after a longer pause, and with a
+# grammar reports words outside it as "[unk]".
+SPEECH_RMS = 500              # 16-bit RMS above which a chunk counts as speech
+SPEECH_END_CHUNKS = 3         # Quiet chunks that end an utterance
+
+class StubVoskModel:
+    """Stands in for vosk.Model."""
+
+    def __init__(self, path=None):
+        self.path = path
+
+class StubKaldiRecognizer:
+    """Stands in for vosk.KaldiRecognizer, fed from WavAudio."""
+
+    def __init__(self, model, sample_rate, grammar=None):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.vocabulary = None
+        if grammar is not None:
+            self.vocabulary = {word for phrase in json.loads(grammar) for word in phrase.split()}
+        self._reset()
+
+    def _reset(self):
+        self._speech_chunks = 0
+        self._quiet_chunks = 0
+        self._words = None
+
+    def SetWords(self, enabled):
+        pass
+
+    def _heard(self):
+        if self._words is None:
+            try:
+                text = spoken.get_nowait()
+            except queue.Empty:
+                text = ''
+            self._words = [word if self.vocabulary is None or word in self.vocabulary else '[unk]'
+                           for word in text.split()]
+        return self._words
+
+    def AcceptWaveform(self, data):
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        loud = samples.size and np.sqrt(np.mean(samples ** 2)) > SPEECH_RMS
+        if loud:
+            self._speech_chunks += 1
+            self._quiet_chunks = 0
+            return False
+        if not self._speech_chunks:
+            return False
+        self._quiet_chunks += 1
+        return self._quiet_chunks >= SPEECH_END_CHUNKS
+
+    def PartialResult(self):
+        partial = ' '.join(self._heard()) if self._speech_chunks and self._quiet_chunks else ''
+        return json.dumps({'partial': partial})
+
+    def Result(self):
+        words = self._heard() if self._speech_chunks else []
+        self._reset()
+        return json.dumps({'text': ' '.join(words),
+                           'result': [{'word': word, 'conf': 1.0} for word in words]})
+
+    def FinalResult(self):
+        return self.Result()
+
+# --- Input Devices ---
+ecodes = SimpleNamespace(EV_SYN=0, EV_KEY=1, EV_ABS=3, SYN_REPORT=0, SYN_DROPPED=3,
+                         ABS_X=0, ABS_Y=1, ABS_HAT0X=16)
+
+def list_devices():
+    """No evdev, so no controllers to find."""
+    return []
+
+# --- Sonar ---
+class SonarTrigger:
+    """HC-SR04 trigger that answers every ping by driving a MockFactory echo pin.
+
+    EchoRanger toggles `trigger.pin.state`; on the falling edge the echo pin
+    goes high for the round-trip time to an obstacle `distance_cm` away.
+    Set `distance_cm` to None to simulate no echo.
+    """
+
+    def __init__(self, echo_pin, distance_cm=200.0, speed_of_sound_cm_s=34326):
+        self.pin = self
+        self.echo_pin = echo_pin
+        self.distance_cm = distance_cm
+        self.speed_of_sound_cm_s = speed_of_sound_cm_s
+        self.pings = 0
+        self._state = False
+        self._ping = threading.Event()
+        threading.Thread(target=self._respond, daemon=True).start()
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        falling = self._state and not value
+        self._state = value
+        if falling:
+            self.pings += 1
+            self._ping.set()
+
+    def _respond(self):
+        while True:
+            self._ping.wait()
+            self._ping.clear()
+            distance = self.distance_cm
+            if distance is None:
+                continue
+            self.echo_pin.drive_high()
+            time.sleep(2 * distance / self.speed_of_sound_cm_s)
+            self.echo_pin.drive_low()
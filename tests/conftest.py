@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tests import the whole app, so run it on simulated hardware.
+os.environ.setdefault('PI5CAR_BACKEND', 'sim')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,309 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from gpiozero import InputDevice as GPIOInputDevice
+from gpiozero.pins import mock
+
+import Pi5car
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+# --- EchoRanger ---
+class ScriptedTrigger:
+    """Answers each ping by driving the echo pin through a scripted pulse.
+
+    The mock pin timestamps its edges with gpiozero.pins.mock.monotonic, so
+    the edge ticks EchoRanger sees are exactly the scripted ones.
+    """
+
+    def __init__(self, echo_pin, clock, pulses):
+        self.pin = self
+        self.echo_pin = echo_pin
+        self.clock = clock
+        self.pulses = list(pulses)
+        self._state = False
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        falling = self._state and not value
+        self._state = value
+        if falling:
+            pulse = self.pulses.pop(0)
+            if pulse is not None:
+                self.clock.advance(0.0005)
+                self.echo_pin.drive_high()
+                self.clock.advance(pulse)
+                self.echo_pin.drive_low()
+
+
+@pytest.fixture
+def echo(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(mock, 'monotonic', clock)
+    device = GPIOInputDevice(5)   # Not used by the car
+    yield device, clock
+    device.close()
+
+
+def test_echo_ranger_measures_scripted_pulse(echo):
+    device, clock = echo
+    pulses = [2 * 100 / Pi5car.SPEED_OF_SOUND_CM_S, 2 * 15 / Pi5car.SPEED_OF_SOUND_CM_S]
+    ranger = Pi5car.EchoRanger(ScriptedTrigger(device.pin, clock, pulses), device)
+    assert ranger.ping() == pytest.approx(100.0)
+    assert ranger.ping() == pytest.approx(15.0)
+
+
+def test_echo_ranger_reports_missing_echo(echo):
+    device, clock = echo
+    ranger = Pi5car.EchoRanger(ScriptedTrigger(device.pin, clock, [None]), device, max_distance_cm=50)
+    assert ranger.ping() is None
+
+
+def test_obstacle_monitor_reads_through_echo_ranger(echo):
+    device, clock = echo
+    distances = [100, 100, 100, 12, 12]
+    pulses = [2 * cm / Pi5car.SPEED_OF_SOUND_CM_S for cm in distances]
+    ranger = Pi5car.EchoRanger(ScriptedTrigger(device.pin, clock, pulses), device)
+    monitor = Pi5car.ObstacleMonitor(ranger, clock=clock)
+    warnings = []
+    for _ in distances:
+        warnings.append(monitor.update(ranger.ping(), clock()).warning)
+        clock.advance(0.05)
+    assert warnings == [False, False, False, False, True]
+    assert monitor.latest.distance_cm == pytest.approx(12.0)
+
+
+# --- ObstacleMonitor ---
+def feed(readings, interval=0.05):
+    monitor = Pi5car.ObstacleMonitor(SimpleNamespace(max_distance_cm=400))
+    return [monitor.update(cm, i * interval).warning for i, cm in enumerate(readings)]
+
+
+def test_obstacle_warning_needs_two_close_readings():
+    assert feed([100, 100, 15, 14]) == [False, False, False, True]
+
+
+def test_obstacle_warning_survives_single_missed_echo():
+    assert feed([100, 100, 15, 14, 12, 12, None, 12]) == [False, False, False, True, True, True, True, True]
+
+
+def test_obstacle_warning_resets_after_consecutive_missed_echoes():
+    readings = [100, 15, 14] + [None] * Pi5car.OBSTACLE_RESET_MISSES
+    assert feed(readings)[-1] is False
+
+
+def test_obstacle_single_glitch_does_not_warn():
+    assert not any(feed([100, 100, None, 5, 100]))
+    assert not any(feed([100] + [None] * Pi5car.OBSTACLE_RESET_MISSES + [5, 100]))
+
+
+def test_obstacle_warning_clears_with_hysteresis():
+    warnings = feed([100, 15, 14, 22, 22, 22, 60, 60, 60, 60])
+    assert warnings[2] is True
+    assert warnings[3:6] == [True, True, True]   # Between the warn and clear distances
+    assert warnings[-1] is False
+
+
+def test_obstacle_monitor_samples_faster_while_moving():
+    moving = [False]
+    monitor = Pi5car.ObstacleMonitor(SimpleNamespace(max_distance_cm=400), is_moving=lambda: moving[0])
+    monitor.update(100, 0.0)
+    monitor.update(100, 0.25)
+    assert monitor.next_interval() == Pi5car.OBSTACLE_SLOW_INTERVAL
+    moving[0] = True
+    assert monitor.next_interval() == Pi5car.OBSTACLE_FAST_INTERVAL
+    monitor.update(10, 0.3)
+    assert monitor.next_interval() == Pi5car.OBSTACLE_CONFIRM_INTERVAL
+
+
+# --- GestureStateMachine ---
+def test_gesture_state_machine_turns_then_stops_then_drives():
+    clock = FakeClock()
+    machine = Pi5car.GestureStateMachine(clock=clock)
+    assert machine.step("none") == Pi5car.STATE_FORWARD
+    assert machine.step("none") is None
+    assert machine.step("turn_left") == Pi5car.STATE_TURNING_LEFT
+    clock.advance(Pi5car.TURN_DURATION - 0.01)
+    assert machine.step("turn_left") is None
+    clock.advance(0.01)
+    assert machine.step("turn_left") == Pi5car.STATE_STOPPED
+    clock.advance(Pi5car.STOP_DURATION_AFTER_TURN)
+    assert machine.step("none") == Pi5car.STATE_FORWARD
+
+
+def test_gesture_state_machine_ignores_repeated_command():
+    clock = FakeClock()
+    machine = Pi5car.GestureStateMachine(clock=clock)
+    machine.step("none")
+    machine.step("turn_right")
+    clock.advance(Pi5car.TURN_DURATION)
+    assert machine.step("turn_right") == Pi5car.STATE_STOPPED
+    clock.advance(Pi5car.STOP_DURATION_AFTER_TURN)
+    assert machine.step("turn_right") == Pi5car.STATE_FORWARD
+    assert machine.step("turn_right") is None
+    assert machine.step("stop") == Pi5car.STATE_STOPPED
+    assert machine.time_until_deadline() == pytest.approx(Pi5car.STOP_DURATION_VICTORY)
+
+
+# --- DeadlineScheduler ---
+def test_deadline_scheduler_runs_steps_on_time():
+    clock = FakeClock()
+    scheduler = Pi5car.DeadlineScheduler(clock=clock)
+    ran = []
+    scheduler.schedule('drive', [(lambda: ran.append('left'), 2.0), (lambda: ran.append('stop'), None)])
+    assert ran == ['left']
+    assert scheduler.run_due() == pytest.approx(2.0)
+    clock.advance(1.9)
+    scheduler.run_due()
+    assert ran == ['left']
+    clock.advance(0.1)
+    assert scheduler.run_due() is None
+    assert ran == ['left', 'stop']
+    assert not scheduler.pending('drive')
+
+
+def test_deadline_scheduler_new_plan_replaces_old():
+    clock = FakeClock()
+    scheduler = Pi5car.DeadlineScheduler(clock=clock)
+    ran = []
+    scheduler.schedule('drive', [(lambda: ran.append('front'), 2.0), (lambda: ran.append('old stop'), None)])
+    clock.advance(1.0)
+    scheduler.schedule('drive', [(lambda: ran.append('back'), 2.0), (lambda: ran.append('stop'), None)])
+    clock.advance(1.5)
+    scheduler.run_due()
+    assert ran == ['front', 'back']
+    clock.advance(0.5)
+    scheduler.run_due()
+    assert ran == ['front', 'back', 'stop']
+
+
+def test_deadline_scheduler_cancel():
+    clock = FakeClock()
+    scheduler = Pi5car.DeadlineScheduler(clock=clock)
+    ran = []
+    scheduler.schedule('drive', [(lambda: ran.append('front'), 2.0), (lambda: ran.append('stop'), None)])
+    scheduler.cancel('drive')
+    clock.advance(5.0)
+    assert scheduler.run_due() is None
+    assert ran == ['front']
+
+
+# --- MotorOutput / DifferentialDrive ---
+@pytest.fixture
+def motor_output():
+    pins = {name: [SimpleNamespace(value=0)] for name in ('in1', 'in2', 'in3', 'in4', 'ena', 'enb')}
+    pins['green'] = [SimpleNamespace(value=0)]
+    pins['red'] = [SimpleNamespace(value=0)]
+    return Pi5car.MotorOutput(pins)
+
+
+def ramp_duties(drive, output):
+    """Step `drive` until its ramp ends; returns channel A duty after each step."""
+    duties = []
+    ramping = True
+    while ramping:
+        ramping = drive.step()
+        duties.append(output.current().ena)
+    return duties
+
+
+def test_drive_ramps_within_acceleration_limit(motor_output):
+    drive = Pi5car.DifferentialDrive(motor_output)
+    drive.set_velocity(1.0, 0.0)
+    per_step = Pi5car.DRIVE_ACCEL_LIMIT / Pi5car.DRIVE_CONTROL_HZ
+    duties = ramp_duties(drive, motor_output)
+    assert duties[0] == pytest.approx(per_step)
+    assert max(b - a for a, b in zip([0.0] + duties, duties)) <= per_step + 0.01
+    assert len(duties) == pytest.approx(1.0 / per_step, abs=1)
+    assert motor_output.current() == Pi5car.channel_command(1.0, 1.0)
+
+
+def test_drive_slows_down_faster_than_it_speeds_up(motor_output):
+    drive = Pi5car.DifferentialDrive(motor_output)
+    drive.set_velocity(1.0, 0.0)
+    speeding_up = ramp_duties(drive, motor_output)
+    drive.set_velocity(0.0, 0.0)
+    slowing_down = ramp_duties(drive, motor_output)
+    assert len(slowing_down) == pytest.approx(Pi5car.DRIVE_CONTROL_HZ / Pi5car.DRIVE_DECEL_LIMIT, abs=1)
+    assert len(slowing_down) < len(speeding_up)
+    assert motor_output.current() == Pi5car.STOP_COMMAND
+
+
+def test_drive_wheel_speeds_keep_curvature():
+    assert Pi5car.DifferentialDrive.wheel_speeds(1.0, 0.5) == (1.0, pytest.approx(0.33))
+    assert Pi5car.DifferentialDrive.wheel_speeds(0.5, 0.5) == (1.0, 0.0)
+
+
+def test_interlock_drops_forward_ramp(motor_output):
+    drive = Pi5car.DifferentialDrive(motor_output)
+    motor_output.set_forward_blocked(True)
+    drive.set_velocity(1.0, 0.0)
+    assert drive.step() is False
+    assert drive.targets() == (0.0, 0.0)
+    assert motor_output.current() == Pi5car.STOP_COMMAND
+
+
+def test_interlock_caps_pivot_duty(motor_output):
+    drive = Pi5car.DifferentialDrive(motor_output)
+    drive.set_velocity(0.5, 0.5)
+    while drive.step():
+        pass
+    assert motor_output.current().ena == 1.0
+    assert motor_output.set_forward_blocked(True) is False
+    assert motor_output.current().ena == Pi5car.INTERLOCK_TURN_DUTY
+    drive.set_velocity(-0.5, 0.5)   # Reversing away is not limited
+    while drive.step():
+        pass
+    assert motor_output.current().enb == 1.0
+
+
+def test_interlock_brakes_car_driving_forward(motor_output):
+    motor_output.apply(Pi5car.channel_command(0.6, 0.6))
+    assert motor_output.set_forward_blocked(True) is True
+    assert motor_output.current() == Pi5car.STOP_COMMAND
+    assert motor_output.apply(Pi5car.channel_command(0.6, 0.6)) is False
+    motor_output.set_forward_blocked(False)
+    assert motor_output.apply(Pi5car.channel_command(0.6, 0.6)) is True
+
+
+# --- Drive Command Channel ---
+class ScriptedSocket:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def receive(self, timeout=None):
+        if not self.messages:
+            raise Pi5car.ConnectionClosed()
+        return self.messages.pop(0)
+
+    def send(self, text):
+        self.sent.append(json.loads(text))
+
+
+@pytest.mark.skipif(Pi5car.Sock is None, reason="needs flask-sock")
+def test_drive_channel_skips_malformed_messages(monkeypatch):
+    monkeypatch.setattr(Pi5car, 'current_control_mode', 'ipad_buttons')
+    bad_before = Pi5car.drive_stats['bad_messages']
+    ws = ScriptedSocket(['not json', '[1, 2]', '{"cmd": "stop", "seq": "7"}',
+                         '{"cmd": "stop", "seq": 1, "rtt": "slow"}', '{"cmd": "stop", "seq": 1}'])
+    Pi5car.drive_channel(ws)
+    assert Pi5car.drive_stats['bad_messages'] - bad_before == 3
+    assert [ack['ack'] for ack in ws.sent] == [1, 1]
+    assert ws.sent[0]['applied'] is True
+    assert ws.sent[1]['stale'] is True